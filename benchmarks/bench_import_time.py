@@ -0,0 +1,71 @@
+"""Regressionstest af importtid pr. kommando i main.py.
+
+For hver kommando importeres de moduler kommandoen indlæser, i en ny proces
+med `-X importtime`, og den samlede importtid sammenlignes med et budget.
+Scriptet afslutter med exit code 1 hvis et budget overskrides:
+
+    uv run python benchmarks/bench_import_time.py [--runs 5]
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+# moduler der importeres af hver kommando og budget for importtiden i ms
+SUBCOMMANDS = {
+    "--help": (["main"], 20),
+    "status": (["main", "context", "status"], 50),
+    "godkend": (["main", "context", "godkend"], 50),
+    "afstem": (["main", "context", "afstem", "driver.connector"], 300),
+    "moms-luk": (["main", "context", "moms_luk", "driver.connector", "renderer"], 350),
+    "opdater": (["main", "context", "opdater", "renderer"], 200),
+}
+
+
+def import_time_ms(modules):
+    """Samlet importtid (ms) for modulerne, målt med -X importtime."""
+    code = f"import sys; sys.path.insert(0, {SRC_PATH!r})\n" + "\n".join(
+        f"import {m}" for m in modules
+    )
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stderr
+    total_us = 0
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        # kun moduler paa oeverste niveau, da cumulative inkluderer undermoduler
+        if not name.startswith("  "):
+            total_us += int(cumulative)
+    return total_us / 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    # interpreterens egne importer (site, encodings, ...) traekkes fra
+    startup = statistics.median(import_time_ms([]) for _ in range(args.runs))
+    failed = False
+    for command, (modules, budget_ms) in SUBCOMMANDS.items():
+        elapsed = (
+            statistics.median(import_time_ms(modules) for _ in range(args.runs))
+            - startup
+        )
+        status = "OK" if elapsed <= budget_ms else "OVER BUDGET"
+        failed |= elapsed > budget_ms
+        print(f"{command:>9}: {elapsed:7.1f} ms (budget {budget_ms} ms) {status}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
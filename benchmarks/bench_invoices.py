@@ -0,0 +1,67 @@
+"""Gennemløb af PDF-fakturaer (fakturaer pr. sekund) pr. antal processer.
+
+Fakturaerne dannes fra salg.txt i et syntetisk firma (benchmarks/synthetic.py)
+med 12 fakturaer pr. kunde pr. år; alle PDF'er dannes igen for hvert antal
+processer (weasyprint skal være installeret):
+
+    uv run python benchmarks/bench_invoices.py --customers 20 --jobs 1 2 4 8
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_PATH, "src"))
+
+import synthetic  # noqa: E402
+from context import LedgerContext  # noqa: E402
+from invoice import generate_invoices, pdf_error  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--customers", type=int, default=20)
+    parser.add_argument("--years", type=int, default=1)
+    parser.add_argument("--jobs", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--output", help="JSON-fil resultatet gemmes i")
+    args = parser.parse_args()
+    if pdf_error() is not None:
+        sys.exit(pdf_error())
+
+    results = {}
+    with tempfile.TemporaryDirectory() as root:
+        periods, enddate = synthetic.generate_company(
+            root, "firma", args.years, 10, args.customers
+        )
+        cwd = os.getcwd()
+        os.chdir(root)
+        try:
+            ctx = LedgerContext(company_name="firma", enddate=enddate)
+            for jobs in args.jobs:
+                start = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    count = len(generate_invoices(ctx, periods, jobs, force=True))
+                elapsed = time.perf_counter() - start
+                results[jobs] = count / elapsed
+                print(
+                    f"{jobs:>3} processer: {count} fakturaer på {elapsed:6.2f}s "
+                    f"({count / elapsed:7.1f}/s, "
+                    f"{results[jobs] / results[args.jobs[0]]:.1f}x)"
+                )
+        finally:
+            os.chdir(cwd)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"customers": args.customers, "per_second": results}, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
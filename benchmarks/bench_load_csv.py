@@ -0,0 +1,88 @@
+"""Sammenligner util.load_csv med den tidligere pandas-baserede indlæsning.
+
+Kørsel (pandas skal være installeret for sammenligningen):
+
+    uv run python benchmarks/bench_load_csv.py --rows 100000
+
+Hver implementering køres i en separat proces, så tid inkl. import og peak
+RSS (ru_maxrss, kB på Linux) måles uafhængigt af hinanden.
+"""
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+from datetime import date, timedelta
+
+SRC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+RUNNER = """
+import resource, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {src!r})
+import constants as const
+if {impl!r} == "pandas":
+    import pandas as pd
+    rows = pd.read_csv({filename!r}, names=const.CSV_SPECS[const.BANK_CSV].keys(),
+        sep=const.SEMICOLON, encoding="utf-8",
+        dtype=const.CSV_SPECS[const.BANK_CSV]).to_dict(orient="records")
+    n = len(rows)
+else:
+    import util
+    n = sum(1 for row in util.load_csv({filename!r}, const.CSV_SPECS[const.BANK_CSV]))
+print(n, time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+"""
+
+
+def write_bank_csv(filename, rows):
+    rnd = random.Random(42)
+    d = date(2020, 1, 1)
+    total = 0
+    with open(filename, "w", encoding="utf-8") as f:
+        for i in range(rows):
+            d += timedelta(days=rnd.choice((0, 0, 1)))
+            amount = rnd.randint(-50000, 50000)
+            total += amount
+            f.write(
+                f"{d.strftime('%d-%m-%Y')};;Tekst {i % 500};"
+                f"{amount / 100:.2f};{total / 100:.2f}\n".replace(".", ",")
+            )
+
+
+def run(impl, filename):
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            RUNNER.format(src=SRC_PATH, impl=impl, filename=filename),
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+    ).stdout.split()
+    return int(out[0]), float(out[1]), int(out[2])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = os.path.join(tmp, "bank.csv")
+        write_bank_csv(filename, args.rows)
+        for impl in ("stdlib", "pandas"):
+            try:
+                n, elapsed, peak_kb = run(impl, filename)
+            except subprocess.CalledProcessError as e:
+                print(f"{impl:>7}: fejlede ({e.stderr.strip().splitlines()[-1]})")
+                continue
+            print(
+                f"{impl:>7}: {n} rækker på {elapsed:.3f}s, peak RSS {peak_kb / 1024:.1f} MB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Tid pr. trin i opdater/afstem-pipelinen på et syntetisk firma, gemt som JSON.
+
+Firmaet dannes med benchmarks/synthetic.py i en midlertidig mappe, og hvert
+trin køres i denne proces med output slået fra:
+
+    uv run python benchmarks/bench_pipeline.py --bank-lines 100000 \\
+        --output bench-100k.json --compare bench-100k-main.json
+
+Store størrelser (fx --bank-lines 1000000) kan begrænses til de trin der
+ikke indlæser regnskabet i beancount med --stages.
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_PATH, "src"))
+
+import synthetic  # noqa: E402
+from beancount import loader  # noqa: E402
+from afstem import handle_afstem  # noqa: E402
+from context import LedgerContext  # noqa: E402
+from driver.connector import BeancountConnector  # noqa: E402
+from opdater import handle_opdater  # noqa: E402
+
+
+def stage_stamdata(ctx):
+    ctx.templates
+    ctx.all_accounts
+    ctx.account_matcher
+    ctx.prices
+    ctx.transaction_types
+
+
+def stage_beancount(ctx, use_cache):
+    # beancounts egen picklecache (skrives naar en indlaesning tager over 1s)
+    # maa ikke goere beancount_cache_miss til et hit
+    loader.initialize(use_cache=False)
+    BeancountConnector(
+        os.path.join(ctx.company_path, "regnskab.beancount"), use_cache=use_cache
+    )
+
+
+# trinene køres i denne rækkefølge på samme LedgerContext
+STAGES = {
+    "stamdata": stage_stamdata,
+    "opdater": lambda ctx: handle_opdater(ctx, force=True),
+    "opdater_uaendret": handle_opdater,
+    "beancount_load": lambda ctx: stage_beancount(ctx, False),
+    "beancount_cache_miss": lambda ctx: stage_beancount(ctx, True),
+    "beancount_cache_hit": lambda ctx: stage_beancount(ctx, True),
+    "afstem": handle_afstem,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=ROOT_PATH,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, root):
+    start = time.perf_counter()
+    periods, enddate = synthetic.generate_company(
+        root, "firma", args.years, args.bank_lines, args.customers, args.seed
+    )
+    timings = {"generate": time.perf_counter() - start}
+
+    # main.py køres fra mappen med templates/ og transaction_type.csv
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        ctx = LedgerContext(company_name="firma", enddate=enddate)
+        for name in args.stages:
+            start = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                STAGES[name](ctx)
+            timings[name] = time.perf_counter() - start
+    finally:
+        os.chdir(cwd)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--bank-lines", type=int, default=1000, help="Pr. år")
+    parser.add_argument("--customers", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--stages", nargs="+", choices=list(STAGES), default=list(STAGES)
+    )
+    parser.add_argument("--output", help="JSON-fil resultatet gemmes i")
+    parser.add_argument("--compare", help="Tidligere JSON-resultat at sammenligne med")
+    args = parser.parse_args()
+    args.stages = [name for name in STAGES if name in args.stages]
+
+    with tempfile.TemporaryDirectory() as root:
+        timings = run(args, root)
+
+    result = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "years": args.years,
+        "bank_lines": args.bank_lines,
+        "customers": args.customers,
+        "seed": args.seed,
+        "stages": timings,
+    }
+    previous = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)["stages"]
+
+    for name, seconds in timings.items():
+        line = f"{name:>22}: {seconds:8.3f}s"
+        if name in previous:
+            line += f"  ({seconds / previous[name]:.2f}x af {previous[name]:.3f}s)"
+        print(line)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
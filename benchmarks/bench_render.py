@@ -0,0 +1,71 @@
+"""Gennemløb (posteringer pr. sekund) for de oversatte skabeloner mod Jinja2.
+
+Hver skabelon i templates/ renderes med de samme transaktioner af begge
+motorer; output sammenlignes, og throughput udskrives:
+
+    uv run python benchmarks/bench_render.py [--count 50000]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_PATH, "src"))
+
+import constants as const  # noqa: E402
+import renderer  # noqa: E402
+from transaction import Transaction  # noqa: E402
+from jinja2 import Environment, FileSystemLoader  # noqa: E402
+
+
+def make_contexts(count, template_name):
+    contexts = []
+    for i in range(count):
+        t = Transaction(
+            date_posted=date(2024, 1, 1) + timedelta(days=i % 365),
+            text="Posteret",
+            extra_text=f"Tekst {i}",
+            amount=Decimal(-i) / 100,
+            account1="Expenses:Mad:Netto",
+            account2="Liabilities:Kreditorer:Netto",
+            template_name=template_name,
+        )
+        if template_name == const.MED_MOMS:
+            t.set_vat("Assets:Moms:KoebMoms", const.VAT_PCT, 0)
+        contexts.append(t.as_dict)
+    return contexts
+
+
+def throughput(template, contexts):
+    start = time.perf_counter()
+    output = "\n\n".join(template.render(c) for c in contexts)
+    return output, len(contexts) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=50000)
+    args = parser.parse_args()
+
+    templates_path = os.path.join(ROOT_PATH, const.TEMPLATE_DIR)
+    compiled = renderer.load_templates(templates_path)
+    jinja_env = Environment(loader=FileSystemLoader(templates_path))
+    for name in (const.MED_MOMS, const.UDEN_MOMS):
+        contexts = make_contexts(args.count, name)
+        jinja_output, jinja_rate = throughput(
+            jinja_env.get_template(f"{name}.txt"), contexts
+        )
+        output, rate = throughput(compiled[name], contexts)
+        same = "identisk" if output == jinja_output else "FORSKELLIGT"
+        print(
+            f"{name:>9}: oversat {rate:10.0f}/s, jinja2 {jinja_rate:10.0f}/s "
+            f"({rate / jinja_rate:.1f}x, output {same})"
+        )
+
+
+if __name__ == "__main__":
+    main()
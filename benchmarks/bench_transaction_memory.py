@@ -0,0 +1,106 @@
+"""Måler hukommelsesforbrug pr. Transaction og BankTransaction.
+
+Instanserne dannes og bruges som i opdater (set_vat, all_accounts og
+as_dict), og den samlede allokering måles med tracemalloc. Til sammenligning
+måles også den tidligere repræsentation: en almindelig dataclass med
+__dict__, hvor de afledte værdier er cached_property:
+
+    uv run python benchmarks/bench_transaction_memory.py [--count 100000]
+"""
+
+import argparse
+import os
+import sys
+import tracemalloc
+from dataclasses import field, fields, make_dataclass
+from datetime import date, timedelta
+from functools import cached_property
+from decimal import Decimal
+
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+)
+
+import constants as const  # noqa: E402
+from bank_transaction import BankTransaction  # noqa: E402
+from transaction import Transaction  # noqa: E402
+
+
+def unslotted(cls):
+    """cls som almindelig dataclass uden slots, med properties som cached_property."""
+    field_names = set(f.name for f in fields(cls))
+    namespace = {}
+    for name, value in vars(cls).items():
+        if name in field_names or name in ("__slots__", "__weakref__"):
+            continue
+        if name.startswith("__") and name != "__post_init__":
+            continue
+        if isinstance(value, property):
+            value = cached_property(value.fget)
+        namespace[name] = value
+    return make_dataclass(
+        cls.__name__,
+        [(f.name, f.type, field(init=f.init, repr=f.repr)) for f in fields(cls)],
+        namespace=namespace,
+    )
+
+
+def make_transactions(cls, count):
+    result = []
+    for i in range(count):
+        t = cls(
+            date_posted=date(2024, 1, 1) + timedelta(days=i % 365),
+            text="Posteret",
+            extra_text="BBB",
+            amount=Decimal(-i) / 100,
+            account1="Expenses:Mad:Netto",
+            account2="Liabilities:Kreditorer:Netto",
+            template_name=const.MED_MOMS,
+        )
+        t.set_vat("Assets:Moms:KoebMoms", const.VAT_PCT, 0)
+        t.all_accounts
+        t.as_dict
+        result.append(t)
+    return result
+
+
+def make_bank_transactions(cls, count):
+    return [
+        cls(
+            date_posted="%02d-01-2024" % (i % 28 + 1,),
+            description="Netto Bygade",
+            amount=Decimal(-i) / 100,
+            total=Decimal(i),
+        )
+        for i in range(count)
+    ]
+
+
+def measure(factory, cls, count):
+    tracemalloc.start()
+    objects = factory(cls, count)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del objects
+    return current / count, peak / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100000)
+    args = parser.parse_args()
+
+    for cls, factory in (
+        (Transaction, make_transactions),
+        (BankTransaction, make_bank_transactions),
+    ):
+        print(f"{cls.__name__}:")
+        for label, variant in (("før", unslotted(cls)), ("slots", cls)):
+            retained, peak = measure(factory, variant, args.count)
+            print(
+                f"{label:>8}: {retained:7.0f} bytes/stk beholdt, {peak:7.0f} bytes/stk peak"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""Deterministisk syntetisk firma til benchmarks.
+
+Danner et komplet firma-træ under root med stamdata (account.csv,
+account_regex.csv, prices.csv) og for hvert år bank.csv, salg.txt,
+loen.txt, udbytte.txt og bank_to_invoice_date.csv, samt
+transaction_type.csv og templates/ i root, så main.py kan køres fra root:
+
+    uv run python benchmarks/synthetic.py /tmp/bench --bank-lines 100000
+
+Samme seed og størrelser giver byte-identiske filer.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+from datetime import date, timedelta
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_PATH, "src"))
+
+import constants as const  # noqa: E402
+import util  # noqa: E402
+
+# (kontogruppe, antal konti) for udgifterne
+EXPENSE_GROUPS = (
+    ("Expenses:Mad", 40),
+    ("Expenses:Tele", 5),
+    ("Expenses:Bank", 3),
+    ("Expenses:Kontor", 30),
+    ("Expenses:Transport", 20),
+    ("Expenses:Software", 25),
+)
+MONTHS = "jan feb mar apr maj jun jul aug sep okt nov dec".split()
+
+
+def format_amount(ore):
+    """Beløb i øre som i bankens eksport, fx -1.146,26."""
+    sign = "-" if ore < 0 else ""
+    kroner, ore = divmod(abs(ore), 100)
+    return f"{sign}{kroner:,}".replace(",", ".") + f",{ore:02d}"
+
+
+def write_lines(filename, lines):
+    with open(filename, "w", encoding="utf-8") as f:
+        f.writelines(line + "\n" for line in lines)
+
+
+def make_accounts(customers):
+    """(kontonavn, kontogruppe, regex, banktekst) for udgifter og indbetalinger."""
+    accounts = []
+    for group, count in EXPENSE_GROUPS:
+        name = group.split(":")[-1]
+        for i in range(count):
+            account_name = f"{name}{i:03d}"
+            accounts.append(
+                (account_name, group, account_name.lower(), f"{account_name} Køb")
+            )
+    for c in range(customers):
+        accounts.append(
+            ("Indbetaling", "Assets:Debitorer", "betaling", f"Kunde{c:02d} betaling")
+        )
+    return accounts
+
+
+def generate_company(
+    root, company_name="firma", years=2, bank_lines=1000, customers=5, seed=42
+):
+    """Danner firmaet; returnerer (perioder, enddate for sidste periode)."""
+    rnd = random.Random(seed)
+    company_path = os.path.join(root, company_name)
+    stamdata_path = os.path.join(company_path, const.STAMDATA_DIR)
+    os.makedirs(stamdata_path, exist_ok=True)
+    os.makedirs(os.path.join(company_path, const.GENERATED_DIR), exist_ok=True)
+
+    shutil.copytree(
+        os.path.join(ROOT_PATH, const.TEMPLATE_DIR),
+        os.path.join(root, const.TEMPLATE_DIR),
+        dirs_exist_ok=True,
+    )
+    write_lines(
+        os.path.join(root, const.TRANSACTION_TYPE_CSV), ["Expenses;2;1", "Assets;1;0"]
+    )
+    write_lines(
+        os.path.join(company_path, "regnskab.beancount"),
+        [
+            'option "operating_currency" "DKK"',
+            'include "kontoplan.beancount"',
+            'include "generated/*.beancount"',
+        ],
+    )
+
+    accounts = make_accounts(customers)
+    expenses = [a for a in accounts if a[1].startswith("Expenses")]
+    payments = [a for a in accounts if a[1] == "Assets:Debitorer"]
+    account_rows = dict((a[0], a[1]) for a in accounts)
+    account_rows.update((f"Kunde{c:02d}", const.INCOME_SALG) for c in range(customers))
+    write_lines(
+        os.path.join(stamdata_path, const.ACCOUNT_CSV),
+        [f"{name};{group}" for name, group in account_rows.items()],
+    )
+    write_lines(
+        os.path.join(stamdata_path, const.ACCOUNT_REGEX_CSV),
+        sorted(set(f"{regex};{name}" for name, group, regex, text in accounts)),
+    )
+
+    first_year = 2025 - years + 1
+    periods = [str(first_year + y) for y in range(years)]
+    write_lines(
+        os.path.join(stamdata_path, const.PRICES_CSV),
+        [
+            f"Kunde{c:02d};{price_type};{period[2:]}0101;{price + 50 * y + c}"
+            for c in range(customers)
+            for price_type, price in (("Timepris", 800), ("Support", 500))
+            for y, period in enumerate(periods)
+        ],
+    )
+
+    total = 0
+    for period in periods:
+        year = int(period)
+        period_path = os.path.join(company_path, period)
+        os.makedirs(period_path, exist_ok=True)
+
+        days = sorted(rnd.randrange(365) for i in range(bank_lines))
+        bank_rows = []
+        for day in days:
+            if rnd.random() < 0.1:
+                name, group, regex, text = rnd.choice(payments)
+                amount = rnd.randint(10000, 4500000)
+            else:
+                name, group, regex, text = rnd.choice(expenses)
+                amount = -rnd.randint(100, 500000)
+            total += amount
+            d = date(year, 1, 1) + timedelta(days=day)
+            bank_rows.append(
+                f"{d.strftime('%d-%m-%Y')};;{text};"
+                f"{format_amount(amount)};{format_amount(total)}"
+            )
+        # bankens eksport er nyeste foerst
+        write_lines(os.path.join(period_path, "bank.csv"), reversed(bank_rows))
+
+        write_lines(
+            os.path.join(period_path, "salg.txt"),
+            [
+                f"Kunde{c:02d};"
+                f"{util.last_day_of_month(date(year, month + 1, 1)):%y%m%d};"
+                f"{MONTHS[month]};{rnd.randint(0, 160) / 2};{rnd.randint(0, 20) / 2}"
+                for month in range(12)
+                for c in range(customers)
+            ],
+        )
+        write_lines(
+            os.path.join(period_path, "loen.txt"),
+            [
+                f"{month + 1:02d}28;{MONTHS[month]};50000;32000.00;94.65;"
+                f"12000;4000;1;230.48"
+                for month in range(12)
+            ],
+        )
+        write_lines(os.path.join(period_path, "udbytte.txt"), ["10000;0.27"])
+        write_lines(os.path.join(period_path, const.BANK_TO_INVOICE_DATE_CSV), [])
+    return periods, date(int(periods[-1]), 12, 31)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="Mappe firmaet dannes i")
+    parser.add_argument("--firma", default="firma")
+    parser.add_argument("--years", type=int, default=2)
+    parser.add_argument("--bank-lines", type=int, default=1000, help="Pr. år")
+    parser.add_argument("--customers", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    periods, enddate = generate_company(
+        args.root, args.firma, args.years, args.bank_lines, args.customers, args.seed
+    )
+    print(f"{args.firma} dannet i {args.root}: perioder {periods}, enddate {enddate}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+from collections import deque
+
+
+class AccountMatcher:
+    """Finder kontoen for den længste søgestreng der indgår i en banktekst.
+
+    Søgestrengene (casefolded) samles i en Aho-Corasick automat, så hver tekst
+    kun gennemløbes én gang uanset antallet af søgestrenge. Ved flere lige
+    lange matches vinder den første række i account_regex.csv. Resultatet
+    gemmes pr. tekst, da de samme tekster går igen mange gange.
+    """
+
+    def __init__(self, patterns):
+        self.goto = [{}]
+        self.fail = [0]
+        # bedste match der slutter i knuden: (-laengde, raekke, konto)
+        self.best = [None]
+        self.cache = {}
+
+        for rank, (account, srch_str) in enumerate(patterns):
+            if not srch_str:
+                continue
+            node = 0
+            for ch in srch_str:
+                if ch not in self.goto[node]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(None)
+                    self.goto[node][ch] = len(self.goto) - 1
+                node = self.goto[node][ch]
+            self.best[node] = self._better(
+                self.best[node], (-len(srch_str), rank, account)
+            )
+
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                fail = self.fail[node]
+                while fail and ch not in self.goto[fail]:
+                    fail = self.fail[fail]
+                self.fail[child] = self.goto[fail].get(ch, 0)
+                self.best[child] = self._better(
+                    self.best[child], self.best[self.fail[child]]
+                )
+
+    @staticmethod
+    def _better(a, b):
+        if a is None:
+            return b
+        if b is None:
+            return a
+        return min(a, b)
+
+    def match(self, desc):
+        """Returnerer konto for den længste søgestreng i desc, eller None."""
+        desc = desc.casefold()
+        if desc in self.cache:
+            return self.cache[desc]
+
+        best = None
+        node = 0
+        for ch in desc:
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            best = self._better(best, self.best[node])
+
+        account = best and best[2]
+        self.cache[desc] = account
+        return account
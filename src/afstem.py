@@ -1,40 +1,140 @@
-from transaction import Transaction
+import re
 from bank_transaction import BankTransaction
+from dataclasses import dataclass, field
 from datetime import date
-from itertools import groupby
+from decimal import Decimal
+from os import path
+import profiling
 import util
 
 
+@dataclass(slots=True)
+class Afvigelse:
+    """En dag hvor saldoen i regnskabet ikke stemmer med bankens saldo."""
+
+    date_posted: date
+    ledger_balance: Decimal
+    bank_total: Decimal
+    delta: Decimal
+    # banklinjer fra dagen der kan forklare en ny eller aendret difference
+    candidates: list = field(default_factory=list)
+
+
+def end_of_day(rows):
+    """Sidste vaerdi pr. dato fra (dato, vaerdi) sorteret efter dato."""
+    result = []
+    for d, value in rows:
+        if result and result[-1][0] == d:
+            result[-1] = (d, value)
+        else:
+            result.append((d, value))
+    return result
+
+
+def afstem(ledger_balances, bank_transactions, opening_balance=Decimal(0)):
+    """Afstemmer regnskabets saldo mod bankens saldo med en sorteret merge-join.
+
+    ledger_balances er (dato, saldo) og bank_transactions BankTransactions,
+    begge i datoorden. Saldoen paa hver side foeres frem til dage hvor kun
+    den anden side har bevaegelser; regnskabet starter i opening_balance,
+    saldoen foer den foerste dato. Returnerer (antal afstemte dage,
+    afvigelser) med en Afvigelse for hver dag hvor saldiene er forskellige.
+    """
+    ledger = end_of_day(ledger_balances)
+    bank = end_of_day((t.date_posted.date(), t.total) for t in bank_transactions)
+    bank_lines = {}
+    for t in bank_transactions:
+        bank_lines.setdefault(t.date_posted.date(), []).append(t)
+
+    afvigelser = []
+    days = 0
+    ledger_balance = opening_balance
+    bank_total = None
+    previous_delta = Decimal(0)
+    i = j = 0
+    while i < len(ledger) or j < len(bank):
+        d = min(
+            i < len(ledger) and ledger[i][0] or date.max,
+            j < len(bank) and bank[j][0] or date.max,
+        )
+        if i < len(ledger) and ledger[i][0] == d:
+            ledger_balance = ledger[i][1]
+            i += 1
+        if j < len(bank) and bank[j][0] == d:
+            bank_total = bank[j][1]
+            j += 1
+        if bank_total is None:
+            continue
+
+        days += 1
+        delta = bank_total - ledger_balance
+        if delta != 0:
+            afvigelse = Afvigelse(d, ledger_balance, bank_total, delta)
+            change = delta - previous_delta
+            if change != 0:
+                lines = bank_lines.get(d, [])
+                afvigelse.candidates = [
+                    t for t in lines if abs(t.amount) == abs(change)
+                ] or lines
+            afvigelser.append(afvigelse)
+        previous_delta = delta
+    return days, afvigelser
+
+
 def handle_afstem(ctx):
+    """Afstemmer hver bankkonto; returnerer fejl for konti der ikke stemmer."""
     print(f"Afstemning for {ctx.company_name} (enddate {ctx.enddate})")
 
     bc = ctx.get_connection()
+    period = str(ctx.enddate.year)
 
-    bank = "Assets:Bank:BankErhverv"
+    errors = []
+    for bank, bank_csv_filename in ctx.bank_accounts:
+        if not path.exists(ctx.company_period_path(period, bank_csv_filename)):
+            errors.append(f"{bank}: {bank_csv_filename} findes ikke i {period}")
+            print(errors[-1])
+            continue
+        with profiling.stage("afstem.regnskab") as st:
+            # kun kontoen selv, ikke fx Assets:Bank:ErhvervOpsparing
+            account = "^%s$" % (re.escape(bank),)
+            start_date = date(ctx.enddate.year, 1, 2)
+            opening_balance = bc.account_balance_before(account, start_date)
+            ledger_balances = bc.account_balance_in_period(
+                account, start_date, ctx.enddate
+            )
+            st.add(len(ledger_balances))
+        with profiling.stage("afstem.bank_csv") as st:
+            bank_transactions = [
+                t
+                for t in BankTransaction.from_bank_csv(
+                    ctx.get_bank_csv(period, bank_csv_filename)
+                )
+                if t.date_posted.date() <= ctx.enddate
+            ]
+            st.add(len(bank_transactions))
 
-    t = bc.account_balance_in_period(bank, date(ctx.enddate.year, 1, 2), ctx.enddate)
-    transactions = [(k, list(g)[-1][1]) for k, g in groupby(t, lambda x: x[0])]
+        with profiling.stage("afstem.merge") as st:
+            days, afvigelser = afstem(
+                ledger_balances, bank_transactions, opening_balance
+            )
+            st.add(days)
+        print(f"{bank} ({bank_csv_filename}) afstemningsdatoer:", days)
+        if not afvigelser:
+            print("Bank stemmer med regnskab")
+            continue
 
-    bank_csv = ctx.get_bank_csv(str(ctx.enddate.year))
-    bank_transactions = dict(
-        [
-            (util.format_date(k), list(v)[-1])
-            for k, v in groupby(
-                BankTransaction.from_bank_csv(bank_csv), key=lambda x: x.date_posted
+        print(f"Afvigelser på {len(afvigelser)} dage:")
+        errors.append(f"{bank}: afvigelser på {len(afvigelser)} dage")
+        for a in afvigelser:
+            print(
+                util.format_date(a.date_posted),
+                "regnskab",
+                util.format_money(a.ledger_balance),
+                "bank",
+                util.format_money(a.bank_total),
+                "difference",
+                util.format_money(a.delta),
             )
-        ]
-    )
-
-    afstemning = [
-        (util.format_date(d), b, bank_transactions[util.format_date(d)].total)
-        for d, b in transactions[1:]
-        if util.format_date(d) in bank_transactions
-    ]
-    print("afstemningsdatoer:", len(afstemning))
-    # print("\n".join([d[0] for d in afstemning]))
-
-    first_diff = next((a for a in afstemning if a[1] != a[2]), None)
-    if not first_diff:
-        print("Bank stemmer med regnskab")
-        return
-    print(first_diff, first_diff[2] - first_diff[1])
+            for t in a.candidates:
+                print("   ", t.description, util.format_money(t.amount))
+    return errors
@@ -0,0 +1,245 @@
+import glob
+import re
+from dataclasses import dataclass, field
+from decimal import Decimal
+from functools import cached_property
+from os import path
+import constants as const
+import util
+
+
+def aggregate_entries(entries, skip_files=()):
+    """Posteringer samlet pr. kildefil, konto og måned i én gennemgang.
+
+    Returnerer {fil: {"accounts": {konto: {"YYYY-MM": [sum, antal]}},
+    "due": [[dato, forfald, tekst, konto, beløb]]}}, hvor "due" er
+    posteringer med due_date metadata. Entries fra filer i skip_files
+    springes over.
+    """
+    files = {}
+    for entry in entries:
+        postings = getattr(entry, "postings", None)
+        if not postings:
+            continue
+        filename = entry.meta.get("filename", "")
+        if filename in skip_files:
+            continue
+        table = files.setdefault(filename, {"accounts": {}, "due": []})
+        month = entry.date.strftime("%Y-%m")
+        for posting in postings:
+            if posting.units is None or not isinstance(posting.units.number, Decimal):
+                continue
+            months = table["accounts"].setdefault(posting.account, {})
+            total, count = months.get(month, (Decimal(0), 0))
+            months[month] = [total + posting.units.number, count + 1]
+            due_date = (posting.meta or {}).get("due_date")
+            if due_date is not None:
+                table["due"].append(
+                    [
+                        util.format_date(entry.date),
+                        str(due_date),
+                        entry.narration,
+                        posting.account,
+                        posting.units.number,
+                    ]
+                )
+    return files
+
+
+def is_complete(entries):
+    """Om entries kan samles uden loader: alle beløb står i filen og ingen pad."""
+    from beancount.core import data
+
+    for entry in entries:
+        if isinstance(entry, data.Pad):
+            return False
+        for posting in getattr(entry, "postings", None) or ():
+            if not isinstance(getattr(posting.units, "number", None), Decimal):
+                return False
+    return True
+
+
+def _to_json(files):
+    return dict(
+        (
+            filename,
+            {
+                "hash": table["hash"],
+                "accounts": dict(
+                    (
+                        account,
+                        dict(
+                            (month, [str(total), count])
+                            for month, (total, count) in months.items()
+                        ),
+                    )
+                    for account, months in table["accounts"].items()
+                ),
+                "due": [row[:4] + [str(row[4])] for row in table["due"]],
+                # include- og plugin-direktiver fra filen, naar den er parset alene
+                **dict(
+                    (key, table[key]) for key in ("include", "plugin") if key in table
+                ),
+            },
+        )
+        for filename, table in files.items()
+    )
+
+
+@dataclass
+class AggregateTable:
+    """Saldobevægelser pr. konto og måned for hele regnskabet.
+
+    Gemmes i firmamappen pr. kildefil med filens hash, så kun filer der er
+    ændret (fx nye perioder fra opdater) skal samles igen.
+    """
+
+    input_hash: str
+    includes: list[str]
+    files: dict = field(default_factory=dict)
+
+    @cached_property
+    def totals(self) -> dict[str, dict[str, tuple[Decimal, int]]]:
+        """{konto: {"YYYY-MM": (sum, antal)}} summeret over alle filer."""
+        totals = {}
+        for table in self.files.values():
+            for account, months in table["accounts"].items():
+                account_totals = totals.setdefault(account, {})
+                for month, (total, count) in months.items():
+                    previous_total, previous_count = account_totals.get(
+                        month, (Decimal(0), 0)
+                    )
+                    account_totals[month] = (
+                        previous_total + Decimal(total),
+                        previous_count + count,
+                    )
+        return totals
+
+    def sum(self, account_regex, start_month=None, end_month=None):
+        """Sum pr. konto der matcher account_regex (som BQL ~) i månederne."""
+        regex = re.compile(account_regex, re.IGNORECASE)
+        result = {}
+        for account, months in sorted(self.totals.items()):
+            if not regex.search(account):
+                continue
+            result[account] = sum(
+                (
+                    total
+                    for month, (total, count) in months.items()
+                    if (start_month is None or month >= start_month)
+                    and (end_month is None or month <= end_month)
+                ),
+                Decimal(0),
+            )
+        return result
+
+    def due(self, account_regex, before):
+        """(dato, forfald, tekst, konto, beløb) med forfald før before, i datoorden."""
+        regex = re.compile(account_regex, re.IGNORECASE)
+        return sorted(
+            (d, due_date, text, account, Decimal(amount))
+            for table in self.files.values()
+            for d, due_date, text, account, amount in table["due"]
+            if regex.search(account) and due_date < before
+        )
+
+    @staticmethod
+    def path(ctx) -> str:
+        return path.join(ctx.company_path, const.AGGREGATES_FILE)
+
+    @staticmethod
+    def load(ctx) -> "AggregateTable":
+        """Indlæser tabellen; er regnskabet ændret, samles de ændrede filer igen.
+
+        De ændrede filer parses hver for sig uden loader (booking, plugins og
+        validering), hvis alle filer i regnskabet har alle beløb og ingen pad
+        og regnskabet ikke har plugins. Ellers indlæses hele regnskabet.
+        """
+        stored = util.load_json(AggregateTable.path(ctx), {})
+        if stored and stored["input_hash"] == util.include_tree_hash(
+            stored["includes"]
+        ):
+            return AggregateTable(
+                stored["input_hash"], stored["includes"], stored["files"]
+            )
+
+        result = AggregateTable._parse_changed_files(ctx, stored.get("files", {}))
+        if result is None:
+            result = AggregateTable._load_changed_files(ctx, stored.get("files", {}))
+        includes, files, changed = result
+        print(f"Aggregater opdateret for {len(changed)} filer")
+
+        files.update(_to_json(changed))
+        table = AggregateTable(util.include_tree_hash(includes), includes, files)
+        util.write_json(
+            AggregateTable.path(ctx),
+            {"input_hash": table.input_hash, "includes": includes, "files": files},
+        )
+        return table
+
+    @staticmethod
+    def _parse_changed_files(ctx, stored_files):
+        """(includes, uændrede, ændrede) med de ændrede filer parset direkte.
+
+        Følger include-direktiverne som loaderen, men genbruger de gemte
+        direktiver for uændrede filer. Returnerer None hvis regnskabet ikke
+        kan samles uden loader.
+        """
+        from beancount.parser import parser
+
+        root = path.normpath(path.abspath(ctx.ledger_filename))
+        includes = []
+        files = {}
+        changed = {}
+        pending = [root]
+        while pending:
+            filename = pending.pop(0)
+            if filename in includes:
+                continue
+            if not path.exists(filename):
+                return None
+            includes.append(filename)
+            file_hash = util.file_hash(filename)
+            table = stored_files.get(filename)
+            if table and table["hash"] == file_hash and "include" in table:
+                files[filename] = table
+            else:
+                entries, errors, options_map = parser.parse_file(filename)
+                if errors or not is_complete(entries):
+                    return None
+                table = aggregate_entries(entries).get(
+                    filename, {"accounts": {}, "due": []}
+                )
+                table["hash"] = file_hash
+                table["include"] = options_map["include"]
+                table["plugin"] = [name for name, config in options_map["plugin"]]
+                changed[filename] = table
+            # kun plugins i hovedfilen koeres af loaderen
+            if filename == root and table["plugin"]:
+                return None
+            for pattern in table["include"]:
+                matched = sorted(
+                    glob.glob(
+                        path.join(path.dirname(filename), pattern), recursive=True
+                    )
+                )
+                if not matched:
+                    return None
+                pending += [path.normpath(fn) for fn in matched]
+        return sorted(includes), files, changed
+
+    @staticmethod
+    def _load_changed_files(ctx, stored_files):
+        """(includes, uændrede, ændrede) med hele regnskabet indlæst."""
+        bc = ctx.get_connection()
+        includes = bc.options["include"]
+        file_hashes = dict((fn, util.file_hash(fn)) for fn in includes)
+        files = dict(
+            (fn, table)
+            for fn, table in stored_files.items()
+            if table["hash"] is not None and table["hash"] == file_hashes.get(fn)
+        )
+        changed = aggregate_entries(bc.entries, skip_files=files)
+        for fn, table in changed.items():
+            table["hash"] = file_hashes.get(fn)
+        return includes, files, changed
@@ -0,0 +1,152 @@
+import json
+from functools import cached_property
+from os import path
+import constants as const
+import util
+from snapshot import SnapshotStore
+
+
+def bank_fingerprint(row):
+    """Banklinjens fingeraftryk: dato, tekst, beløb og saldo som i bank.csv.
+
+    Saldoen adskiller ellers ens køb samme dag, så kun en linje der optræder
+    to gange (fx fra overlappende eksporter) får samme fingeraftryk.
+    """
+    return "|".join(
+        row[column] or ""
+        for column in (const.DATE_POSTED, const.DESCRIPTION, const.AMOUNT, const.TOTAL)
+    )
+
+
+def index_key(period, filename):
+    """Nøglen for en periodes bankfil i indekset, fx "2025/bank.csv"."""
+    return f"{period}/{filename}"
+
+
+def fingerprints_filename(key):
+    period, filename = key.split("/", 1)
+    return f"banklinjer{period}_{path.splitext(filename)[0]}.txt"
+
+
+class BankLineIndex:
+    """Fingeraftryk af banklinjerne i hver periodes bankfiler.
+
+    Hver bankkonto har sin egen fil (ctx.bank_accounts), og en linje hører
+    til den første periode den optræder i for kontoens fil; i senere
+    perioder er den en dublet. generated/bank_index.json har pr. periode og
+    fil filens hash og dubletterne, og fingeraftrykkene ligger i
+    generated/banklinjer<periode>_<fil>.txt. Er ingen bankfil ændret, bruges
+    dubletterne direkte uden at fingeraftrykkene læses.
+    """
+
+    def __init__(self, summary, read_fingerprints, changed=()):
+        # "periode/fil" -> {"hash": hash af filen, "duplicates": [...]}
+        self.summary = summary
+        # "periode/fil" -> fingeraftryk; kaldes kun naar de skal bruges
+        self._read_fingerprints = read_fingerprints
+        # noegler hvis fingeraftryk er dannet paa ny fra bankfilen
+        self.changed = list(changed)
+
+    @cached_property
+    def fingerprints(self) -> dict[str, list[str]]:
+        return dict((key, self._read_fingerprints(key)) for key in sorted(self.summary))
+
+    @cached_property
+    def owners(self) -> dict[tuple[str, str], str]:
+        """(fil, fingeraftryk) -> nøglen for den periode linjen hører til."""
+        owners = {}
+        for key, fingerprints in self.fingerprints.items():
+            filename = key.split("/", 1)[1]
+            for fingerprint in fingerprints:
+                owners.setdefault((filename, fingerprint), key)
+        return owners
+
+    @staticmethod
+    def path(ctx) -> str:
+        return path.join(ctx.company_generated_path, const.BANK_INDEX)
+
+    @staticmethod
+    def load(ctx) -> "BankLineIndex":
+        stored = util.load_json(BankLineIndex.path(ctx), {})
+        summary = {}
+        changed = {}
+        for period in ctx.periods:
+            for account, filename in ctx.bank_accounts:
+                bank_hash = util.file_hash(ctx.company_period_path(period, filename))
+                if bank_hash is None:
+                    continue
+                key = index_key(period, filename)
+                fingerprints_path = path.join(
+                    ctx.company_generated_path, fingerprints_filename(key)
+                )
+                cached = stored.get(key)
+                if (
+                    cached
+                    and cached["hash"] == bank_hash
+                    and path.exists(fingerprints_path)
+                ):
+                    summary[key] = cached
+                    continue
+                summary[key] = {"hash": bank_hash, "duplicates": []}
+                changed[key] = list(
+                    dict.fromkeys(
+                        bank_fingerprint(row)
+                        for row in ctx.get_bank_csv(period, filename)
+                    )
+                )
+
+        def read_fingerprints(key):
+            if key in changed:
+                return changed[key]
+            filename = path.join(ctx.company_generated_path, fingerprints_filename(key))
+            with open(filename, encoding="utf-8") as f:
+                return f.read().splitlines()
+
+        index = BankLineIndex(summary, read_fingerprints, changed)
+        if changed or set(stored) != set(summary):
+            index.update_duplicates()
+        return index
+
+    @staticmethod
+    def approved(ctx) -> "BankLineIndex | None":
+        """Indekset som det var ved seneste godkendelse, eller None."""
+        store = SnapshotStore(ctx.company_path)
+        latest = store.latest()
+        files = latest and latest["files"] or {}
+        summary_file = files.get(path.join(const.GENERATED_DIR, const.BANK_INDEX))
+        if not summary_file:
+            return None
+
+        def read_fingerprints(key):
+            entry = files[path.join(const.GENERATED_DIR, fingerprints_filename(key))]
+            return store.read_blob(entry[0]).decode("utf-8").splitlines()
+
+        return BankLineIndex(
+            json.loads(store.read_blob(summary_file[0])), read_fingerprints
+        )
+
+    def update_duplicates(self) -> None:
+        for key, summary in self.summary.items():
+            filename = key.split("/", 1)[1]
+            summary["duplicates"] = sorted(
+                fingerprint
+                for fingerprint in self.fingerprints[key]
+                if self.owners[(filename, fingerprint)] != key
+            )
+
+    def duplicates(self, period, filename) -> frozenset[str]:
+        """Fingeraftryk i periodens bankfil der findes i en tidligere periode."""
+        summary = self.summary.get(index_key(period, filename))
+        return frozenset(summary["duplicates"] if summary else ())
+
+    def new_since(self, other) -> list[tuple[str, str]]:
+        """(fil, fingeraftryk) der ikke findes i other, fx ved seneste godkendelse."""
+        return [owner for owner in self.owners if owner not in other.owners]
+
+    def write(self, ctx) -> None:
+        """Gemmer oversigten og fingeraftrykkene for perioder dannet paa ny."""
+        for key in self.changed:
+            ctx.write_file_in_generated_dir(
+                fingerprints_filename(key), self.fingerprints[key]
+            )
+        ctx.write_generated_json(const.BANK_INDEX, self.summary)
@@ -4,7 +4,7 @@ import constants as const
 from decimal import Decimal
 
 
-@dataclass
+@dataclass(slots=True)
 class BankTransaction:
     date_posted: str
     description: str
@@ -12,10 +12,29 @@ class BankTransaction:
     total: Decimal
 
     def __post_init__(self):
-        self.date_posted = util.bank_date_parser(self.date_posted)
+        if isinstance(self.date_posted, str):
+            self.date_posted = util.bank_date_parser(self.date_posted)
 
     @staticmethod
     def from_bank_csv(rows):
+        """Danner transaktionerne kolonnevis: datoer og beløb parses samlet."""
+        rows = list(rows)
+        dates = util.parse_bank_dates([row[const.DATE_POSTED] for row in rows])
+        amounts = util.parse_amounts([row[const.AMOUNT] for row in rows], const.COMMA)
+        totals = util.parse_amounts([row[const.TOTAL] for row in rows], const.COMMA)
+        return [
+            BankTransaction(
+                date_posted=date_posted,
+                description=row[const.DESCRIPTION],
+                amount=amount,
+                total=total,
+            )
+            for row, date_posted, amount, total in zip(rows, dates, amounts, totals)
+        ]
+
+    @staticmethod
+    def from_bank_csv_rowwise(rows):
+        """Reference for from_bank_csv, som parser én række ad gangen."""
         result = []
         for row in rows:
             result.append(
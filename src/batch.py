@@ -0,0 +1,128 @@
+import glob
+import io
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from dataclasses import dataclass, field
+from os import path
+from context import LedgerContext
+import renderer
+import constants as const
+
+COMMANDS = ("opdater", "afstem", "moms-luk")
+
+# skabeloner oversat én gang pr. worker og delt af alle firmaer
+_worker_templates = None
+
+
+@dataclass(slots=True)
+class CompanyResult:
+    company_name: str
+    # (kommando, sekunder, fejl eller None)
+    commands: list = field(default_factory=list)
+    output: str = ""
+
+
+def find_companies(patterns):
+    """Firma-mapper ud fra navne eller glob-mønstre, i den givne rækkefølge."""
+    companies = []
+    for pattern in patterns:
+        for company in sorted(glob.glob(pattern)) or [pattern]:
+            company = path.normpath(company)
+            # kun mapper med stamdata er firmaer
+            if (
+                path.isdir(path.join(company, const.STAMDATA_DIR))
+                and company not in companies
+            ):
+                companies.append(company)
+    return companies
+
+
+def _init_worker(templates_path):
+    global _worker_templates
+    # kommandomodulerne og beancount importeres én gang pr. worker
+    import afstem  # noqa: F401
+    import moms_luk  # noqa: F401
+    import opdater  # noqa: F401
+    from driver import connector  # noqa: F401
+
+    _worker_templates = renderer.load_templates(templates_path)
+
+
+def run_company(company_name, enddate, commands):
+    """Kører kommandoerne for et firma; stopper ved første fejl."""
+    from afstem import handle_afstem
+    from moms_luk import handle_moms_luk
+    from opdater import handle_opdater
+
+    handlers = {
+        "opdater": handle_opdater,
+        "afstem": handle_afstem,
+        "moms-luk": handle_moms_luk,
+    }
+    result = CompanyResult(company_name)
+    output = io.StringIO()
+    with redirect_stdout(output):
+        try:
+            ctx = LedgerContext(company_name=company_name, enddate=enddate)
+            if _worker_templates is not None:
+                ctx.templates = _worker_templates
+        except Exception:
+            result.commands.append(("context", 0.0, traceback.format_exc(limit=1)))
+            commands = []
+        for command in commands:
+            start = time.perf_counter()
+            try:
+                # kommandoerne returnerer deres fejl, ogsaa dem de kun udskriver
+                errors = handlers[command](ctx)
+                error = errors and "\n".join(errors) or None
+            except Exception:
+                error = traceback.format_exc()
+            result.commands.append((command, time.perf_counter() - start, error))
+            if error:
+                break
+    result.output = output.getvalue()
+    return result
+
+
+def handle_batch(patterns, enddate, commands, jobs=1, verbose=False):
+    companies = find_companies(patterns)
+    if not companies:
+        print("Ingen firmaer fundet:", " ".join(patterns))
+        return []
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(
+        max_workers=max(1, min(jobs, len(companies))),
+        initializer=_init_worker,
+        initargs=(path.join(".", const.TEMPLATE_DIR),),
+    ) as executor:
+        results = list(
+            executor.map(
+                run_company,
+                companies,
+                [enddate] * len(companies),
+                [commands] * len(companies),
+            )
+        )
+
+    print(f"Batch: {len(companies)} firmaer på {time.perf_counter() - start:.2f}s")
+    failed = 0
+    for result in results:
+        errors = [error for command, seconds, error in result.commands if error]
+        failed += bool(errors)
+        print(
+            f"{result.company_name}: {errors and 'FEJL' or 'OK'} "
+            + " ".join(
+                f"{command}={seconds:.2f}s"
+                for command, seconds, error in result.commands
+            )
+        )
+        for error in errors:
+            print("    " + error.strip().splitlines()[-1])
+        if verbose or errors:
+            for line in result.output.splitlines():
+                print("    | " + line)
+    print(f"{len(results) - failed} OK, {failed} med fejl")
+    return results
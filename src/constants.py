@@ -6,6 +6,16 @@ VAT_FRACTION = VAT_PCT / (1 + VAT_PCT)
 
 TEMPLATE_DIR = "templates"
 GENERATED_DIR = "generated"
+STAMDATA_DIR = "stamdata"
+# periodens bilag, fx dannede fakturaer
+BILAG_DIR = "bilag"
+GENERATED_MANIFEST = "manifest.json"
+# fingeraftryk af banklinjerne pr. periode, i generated/
+BANK_INDEX = "bank_index.json"
+# saldobevaegelser pr. konto og maaned, ved siden af generated/
+AGGREGATES_FILE = ".aggregates.json"
+# godkendte snapshots af firmaets filer (godkend)
+SNAPSHOT_DIR = ".godkendt"
 
 TAB = "\t"
 COMMA = ","
@@ -34,6 +44,7 @@ ACCOUNT_NAME = "account_name"
 ACCOUNT_GROUP = "account_group"
 REGEX = "regex"
 DATE_POSTED_KEY = "date_posted_key"
+FILENAME = "filename"
 
 ANTAL_POSTERINGER = "ANTAL_POSTERINGER"
 MED_MOMS = "med_moms"
@@ -81,6 +92,7 @@ UDBYTTE_SKAT_PCT = "udbytte_skat_pct"
     PRICES_CSV,
     LOEN_CSV,
     UDBYTTE_CSV,
+    BANK_ACCOUNTS_CSV,
 ) = [
     "%s.csv" % (fn,)
     for fn in (
@@ -97,9 +109,19 @@ UDBYTTE_SKAT_PCT = "udbytte_skat_pct"
         "prices",
         "loen",
         "udbytte",
+        "bank_accounts",
     )
 ]
 
+# input filer i en periode-mappe, som de genererede filer afhaenger af
+PERIOD_INPUT_FILES = (
+    "bank.csv",
+    "salg.txt",
+    "loen.txt",
+    "udbytte.txt",
+    BANK_TO_INVOICE_DATE_CSV,
+)
+
 
 CSV_SPECS = OrderedDict(
     [
@@ -192,6 +214,15 @@ CSV_SPECS = OrderedDict(
                 ]
             ),
         ),
+        (
+            BANK_ACCOUNTS_CSV,
+            OrderedDict(
+                [
+                    (ACCOUNT, str),
+                    (FILENAME, str),
+                ]
+            ),
+        ),
         (
             UDBYTTE_CSV,
             OrderedDict(
@@ -1,22 +1,45 @@
+import hashlib
+import glob
 import os
 import re
+from bisect import bisect_right
 from os import path
 from collections import defaultdict
 from datetime import datetime, date
-from jinja2 import Environment, FileSystemLoader
-from dataclasses import dataclass
-from driver.connector import BeancountConnector
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING
+from account_matcher import AccountMatcher
 import constants as const
+import profiling
+import renderer
+from snapshot import SnapshotStore
 import util
 from functools import cached_property
 from decimal import Decimal
 
+# beancount importeres foerst naar de bruges, saa
+# kommandoer der ikke skal bruge dem starter hurtigt
+if TYPE_CHECKING:
+    from driver.connector import BeancountConnector
+
+
+@dataclass(slots=True, frozen=True)
+class ResolvedAccount:
+    """En konto fra account.csv med dens transaktionstype (None hvis ingen)."""
+
+    account_name: str
+    account_group: str
+    full_account_name: str
+    transaction_type: dict | None
+
 
 @dataclass
 class LedgerContext:
     company_name: str
     enddate: date
     root_path: str = "."
+    # filer der faktisk er blevet aendret af write-metoderne i denne koersel
+    changed_files: list[str] = field(default_factory=list, init=False)
 
     def __post_init__(self):
         if isinstance(self.enddate, str):
@@ -57,52 +80,129 @@ class LedgerContext:
         return path.join(self.company_path, period, filename)
 
     def company_metadata_path(self, filename: str) -> str:
-        return path.join(self.company_path, "stamdata", filename)
+        return path.join(self.company_path, const.STAMDATA_DIR, filename)
 
-    def write_file_in_generated_dir(self, filename: str, content) -> None:
-        util.write_file(
-            path.join(self.company_generated_path, filename),
-            content,
+    @cached_property
+    def shared_input_files(self) -> list[str]:
+        """Filer som alle perioders genererede filer afhaenger af."""
+        stamdata_path = path.join(self.company_path, const.STAMDATA_DIR)
+        return (
+            [path.join(stamdata_path, fn) for fn in sorted(os.listdir(stamdata_path))]
+            # kun posteringsskabelonerne; fakturaernes html/css har eget manifest
+            + sorted(glob.glob(path.join(self.templates_path, "*.txt")))
+            + [const.TRANSACTION_TYPE_CSV]
         )
 
-    def render_period_transactions(self, period: str, transactions) -> None:
-        self.render_transactions(period, "", transactions)
+    def reload_inputs(self) -> None:
+        """Glemmer alt der er indlæst fra stamdata, skabeloner og perioder."""
+        for name in (
+            "periods",
+            "shared_input_files",
+            "templates",
+            "all_accounts",
+            "account_regexes",
+            "account_matcher",
+            "bank_accounts",
+            "prices",
+            "transaction_types",
+            "resolved_accounts",
+        ):
+            self.__dict__.pop(name, None)
+
+    def period_input_hash(self, period: str) -> str:
+        """Hash af alle input til en periodes genererede filer."""
+        sha = hashlib.sha256()
+        # transaktioner efter enddate udelades, saa den gaelder for indevaerende aar
+        sha.update(str(min(self.enddate, date(int(period), 12, 31))).encode("utf-8"))
+        # bankfiler for andre konti end bank.csv, jf. bank_accounts
+        period_files = list(const.PERIOD_INPUT_FILES) + [
+            fn
+            for account, fn in self.bank_accounts
+            if fn not in const.PERIOD_INPUT_FILES
+        ]
+        for filename in self.shared_input_files + [
+            self.company_period_path(period, fn) for fn in period_files
+        ]:
+            sha.update(f"{filename}:{util.file_hash(filename)}\n".encode("utf-8"))
+        return sha.hexdigest()
+
+    @property
+    def generated_manifest_path(self) -> str:
+        return path.join(self.company_generated_path, const.GENERATED_MANIFEST)
+
+    def load_generated_manifest(self) -> dict:
+        return util.load_json(self.generated_manifest_path, {})
+
+    def write_generated_manifest(self, manifest: dict) -> None:
+        self.write_generated_json(const.GENERATED_MANIFEST, manifest)
+
+    def write_generated_json(self, filename: str, content) -> bool:
+        filename = path.join(self.company_generated_path, filename)
+        return self._track_change(filename, util.write_json(filename, content))
+
+    def _track_change(self, filename: str, changed: bool) -> bool:
+        if changed:
+            self.changed_files.append(filename)
+        return changed
+
+    def write_file_in_generated_dir(self, filename: str, content) -> bool:
+        filename = path.join(self.company_generated_path, filename)
+        return self._track_change(filename, util.write_file(filename, content))
 
-    def render_transactions(self, period: str, prefix: str, transactions) -> None:
-        output = []
+    def render_period_transactions(self, period: str, transactions) -> str:
+        return self.render_transactions(period, "", transactions)
+
+    def render_transactions(self, period: str, prefix: str, transactions) -> str:
+        """Renderer og skriver posteringerne løbende til generated/; returnerer filnavnet."""
+        filename = f"{prefix}{period}.beancount"
+        full_filename = path.join(self.company_generated_path, filename)
+        # render og skrivning koerer samtidig; render taelles for sig
+        rendered = profiling.iterate(
+            "render", self.iter_rendered_transactions(transactions)
+        )
+        with profiling.stage("write") as st:
+            self._track_change(
+                full_filename,
+                util.write_chunks(full_filename, util.join_chunks("\n\n", rendered)),
+            )
+            st.add(len(transactions))
+        return filename
+
+    def iter_rendered_transactions(self, transactions):
         for t in transactions:
             if t.date_posted > self.enddate:
                 continue
-            template = self.templates[t.template_name]
-            output.append(template.render(t.as_dict))
-        self.write_file_in_generated_dir(
-            f"{prefix}{period}.beancount", "\n\n".join(output)
-        )
+            yield self.templates[t.template_name].render(t.as_dict)
 
     def write_period_file(self, period: str, content) -> None:
         self.write_file_in_generated_dir("%s.beancount" % (period,), content)
 
     def append_generated_file(self, period, prefix, content) -> None:
-        util.append_file(
-            path.join(self.company_generated_path, "%s.beancount" % (prefix,)),
-            content,
-        )
+        filename = path.join(self.company_generated_path, "%s.beancount" % (prefix,))
+        util.append_file(filename, content)
+        self._track_change(filename, True)
+
+    def write_company_kontoplan_file(self, content) -> bool:
+        filename = path.join(self.company_path, "kontoplan.beancount")
+        return self._track_change(filename, util.write_file(filename, content))
 
-    def write_company_kontoplan_file(self, content) -> None:
-        util.write_file(path.join(self.company_path, "kontoplan.beancount"), content)
+    @property
+    def ledger_filename(self) -> str:
+        return path.join(self.company_path, "regnskab.beancount")
 
-    def get_connection(self) -> BeancountConnector:
-        return BeancountConnector(path.join(self.company_path, "regnskab.beancount"))
+    def get_connection(self) -> "BeancountConnector":
+        from driver.connector import BeancountConnector
+
+        return BeancountConnector(self.ledger_filename)
+
+    @cached_property
+    def last_approved(self) -> date | None:
+        """Enddate for seneste godkendelse, læst fra godkend's manifest."""
+        return SnapshotStore(self.company_path).last_approved()
 
     @cached_property
     def templates(self):
-        jinja_env = Environment(loader=FileSystemLoader(self.templates_path))
-        return dict(
-            [
-                (fn.split(".")[0], jinja_env.get_template(fn))
-                for fn in os.listdir(self.templates_path)
-            ]
-        )
+        return renderer.load_templates(self.templates_path)
 
     @cached_property
     def all_accounts(self):
@@ -130,6 +230,13 @@ class LedgerContext:
             ),
         )
 
+    @cached_property
+    def account_matcher(self) -> AccountMatcher:
+        return AccountMatcher(
+            (account_name, srch_str)
+            for account_name, regex, srch_str in self.account_regexes
+        )
+
     def get_bank_to_invoice_date(self, period: str):
         tmp = util.csv_to_dict(
             self.company_period_path(period, const.BANK_TO_INVOICE_DATE_CSV),
@@ -138,11 +245,30 @@ class LedgerContext:
         )
         return tmp
 
-    def get_bank_csv(self, period: str):
+    @cached_property
+    def bank_accounts(self) -> list[tuple[str, str]]:
+        """(konto, csv-filnavn i perioden) for hver bankkonto der afstemmes.
+
+        Læses fra stamdata/bank_accounts.csv; uden den afstemmes
+        Assets:Bank:BankErhverv mod bank.csv.
+        """
+        filename = self.company_metadata_path(const.BANK_ACCOUNTS_CSV)
+        if not path.exists(filename):
+            return [(const.BANK_ERHVERV, "bank.csv")]
+        return util.csv_to_list(
+            filename,
+            const.CSV_SPECS[const.BANK_ACCOUNTS_CSV],
+            lambda x: (x[const.ACCOUNT], x[const.FILENAME]),
+        )
+
+    def get_bank_csv(self, period: str, filename: str = "bank.csv"):
+        # bankens eksport er nyeste foerst
         return reversed(
-            util.load_csv(
-                self.company_period_path(period, "bank.csv"),
-                const.CSV_SPECS[const.BANK_CSV],
+            list(
+                util.load_csv(
+                    self.company_period_path(period, filename),
+                    const.CSV_SPECS[const.BANK_CSV],
+                )
             )
         )
 
@@ -160,19 +286,34 @@ class LedgerContext:
 
     @cached_property
     def prices(self):
-        prices = defaultdict(lambda: defaultdict(list))
+        """Priser pr. (konto, pristype) som (sorterede datoer, priser).
+
+        prices.csv skal være i datoorden pr. konto og pristype uden gentagne
+        datoer; alle afvigelser rapporteres samlet.
+        """
+        prices = defaultdict(lambda: ([], []))
+        errors = []
         for row in util.load_csv(
             self.company_metadata_path(const.PRICES_CSV),
             const.CSV_SPECS[const.PRICES_CSV],
         ):
-            prices[row[const.ACCOUNT_NAME]][row[const.PRICE_TYPE]].append(
-                (
-                    datetime.strptime(row[const.YYMMDD], "%y%m%d"),
-                    Decimal(row[const.PRICE]),
+            key = (row[const.ACCOUNT_NAME], row[const.PRICE_TYPE])
+            from_date = datetime.strptime(row[const.YYMMDD], "%y%m%d")
+            dates, values = prices[key]
+            if dates and from_date == dates[-1]:
+                errors.append("%s %s: dato %s er gentaget" % (*key, row[const.YYMMDD]))
+                continue
+            if dates and from_date < dates[-1]:
+                errors.append(
+                    "%s %s: dato %s kommer efter %s (ikke i datoorden)"
+                    % (*key, row[const.YYMMDD], dates[-1].strftime("%y%m%d"))
                 )
-            )
-        # return {k: dict(v) for k, v in _prices.items()}
-        return prices
+                continue
+            dates.append(from_date)
+            values.append(Decimal(row[const.PRICE]))
+        if errors:
+            raise ValueError("Fejl i %s:\n%s" % (const.PRICES_CSV, "\n".join(errors)))
+        return dict(prices)
 
     def get_salg_csv(self, period):
         return util.load_csv(
@@ -192,6 +333,52 @@ class LedgerContext:
             ]
         )
 
+    @cached_property
+    def resolved_accounts(self) -> dict[str, ResolvedAccount]:
+        """Konti fra account.csv nøglet på kontonavn i casefold.
+
+        Transaktionstypen er den for den længste del af kontogruppen der
+        findes i transaction_type.csv, ellers den for kontonavnet.
+        """
+        resolved = {}
+        for key, (account_group, full_account_name) in self.all_accounts.items():
+            account_name = full_account_name.split(":")[-1]
+            group_split = account_group.split(":")
+            candidates = [
+                ":".join(group_split[:i]) for i in range(len(group_split), 0, -1)
+            ] + [account_name]
+            transaction_type = next(
+                (
+                    self.transaction_types[c]
+                    for c in candidates
+                    if c in self.transaction_types
+                ),
+                None,
+            )
+            resolved[key] = ResolvedAccount(
+                account_name, account_group, full_account_name, transaction_type
+            )
+        return resolved
+
+    def validate_resolved_accounts(self) -> list[str]:
+        """Fejl for konti i account_regex.csv der ikke findes eller mangler transaktionstype."""
+        errors = []
+        for account_name in dict.fromkeys(a for a, regex, s in self.account_regexes):
+            resolved = self.resolved_accounts.get(account_name.casefold())
+            if resolved is None:
+                errors.append(
+                    "Konto %s i %s findes ikke i %s"
+                    % (account_name, const.ACCOUNT_REGEX_CSV, const.ACCOUNT_CSV)
+                )
+            elif resolved.transaction_type is None:
+                errors.append(
+                    "Ingen transaktionstype for %s %s"
+                    % (resolved.account_group, resolved.account_name)
+                )
+        return errors
+
     def find_price(self, account_name, price_type, dt):
-        matches_reversed = reversed(self.prices[account_name][price_type])
-        return next((price for from_date, price in matches_reversed if from_date <= dt))
+        """Seneste pris gældende pr. dt, eller None hvis der ingen pris er."""
+        dates, values = self.prices.get((account_name, price_type), ((), ()))
+        i = bisect_right(dates, dt)
+        return values[i - 1] if i else None
@@ -1,67 +1,297 @@
+import io
 import os
+import pickle
+import re
+import time
+from bisect import bisect_left, bisect_right, insort
+from collections import defaultdict
+from itertools import accumulate
+from os import path
+from decimal import Decimal
+import beancount
+import profiling
+import util
 from beancount import loader
-from beanquery import query
+from beancount.core import data, getters
+from beancount.core.account import has_component, parent_matcher
+from beancount.ops import balance, validation
 from beancount.parser import printer
 
+# Cachefil med de indlæste entries/options/errors, placeret ved siden af regnskabsfilen.
+CACHE_FILENAME = ".{filename}.ledgercache"
+
+# beancounts egen picklecache er noeglet paa mtime og ser ikke nye filer der
+# matcher et include-glob; den slaas fra, saa kun cachen herunder bruges
+loader.initialize(use_cache=False)
+
+
+def include_tree_hash(filenames):
+    """Indholds-hash af alle inkluderede filer og beancount versionen."""
+    return util.include_tree_hash(filenames, beancount.__version__)
+
+
+def _error_key(error):
+    return (error.source["filename"], error.source["lineno"], error.message)
+
+
+class PostingSeries:
+    """Posteringer for en eller flere konti sorteret efter dato med løbende saldo."""
+
+    def __init__(self, rows):
+        self.dates = [d for seq, d, n in rows]
+        self.numbers = [n for seq, d, n in rows]
+        self.balances = list(accumulate(self.numbers, initial=Decimal(0)))
+
+    def bounds(self, start_date, end_date):
+        lo = bisect_left(self.dates, start_date) if start_date else 0
+        hi = bisect_right(self.dates, end_date) if end_date else len(self.dates)
+        return lo, max(lo, hi)
+
+
+class PostingIndex:
+    """Indeks over alle posteringer i en snapshot, grupperet pr. konto.
+
+    Opslag med et konto-regex (samme semantik som BQL `account ~`) samler
+    posteringerne fra de matchende konti i én serie, som caches pr. regex.
+    """
+
+    def __init__(self, entries):
+        postings = defaultdict(list)
+        seq = 0
+        for entry in entries:
+            if isinstance(entry, data.Transaction):
+                for posting in entry.postings:
+                    postings[posting.account].append(
+                        (seq, entry.date, posting.units.number)
+                    )
+                    seq += 1
+        self.postings = dict(postings)
+        self.series = {}
+
+    def get(self, account_regex):
+        if account_regex not in self.series:
+            pattern = re.compile(account_regex, re.IGNORECASE)
+            accounts = [a for a in self.postings if pattern.search(a)]
+            if len(accounts) == 1:
+                rows = self.postings[accounts[0]]
+            else:
+                # entries er datosorteret, så rækkefølgen i regnskabet (seq)
+                # giver samme rækkefølge som BQL inden for samme dato
+                rows = sorted(row for a in accounts for row in self.postings[a])
+            self.series[account_regex] = PostingSeries(rows)
+        return self.series[account_regex]
+
 
 class BeancountConnector:
-    def __init__(self, filename):
+    def __init__(self, filename, use_cache=True):
         if not os.path.exists(filename):
             raise FileNotFoundError(f"Regnskabsfilen '{filename}' blev ikke fundet.")
 
         self.filename = filename
+        self._index = None
+        self.use_cache = use_cache
+        self.cache_filename = path.join(
+            path.dirname(filename),
+            CACHE_FILENAME.format(filename=path.basename(filename)),
+        )
         self.refresh()
 
     def refresh(self):
         """Genindlæser data fra filen (svarer til at opdatere en snapshot-view)."""
-        self.entries, self.errors, self.options = loader.load_file(self.filename)
+        start = time.perf_counter()
+        self._index = None
+        with profiling.stage("beancount.cache_read"):
+            cached = self.use_cache and self._read_cache()
+        if cached:
+            self.entries, self.errors, self.options = cached
+            status = "cache hit"
+        else:
+            with profiling.stage("beancount.load") as st:
+                self.entries, self.errors, self.options = loader.load_file(
+                    self.filename
+                )
+                st.add(len(self.entries))
+            status = "uden cache"
+            if self.use_cache:
+                with profiling.stage("beancount.cache_write"):
+                    self._write_cache()
+                status = "cache miss"
+        print(
+            f"Regnskab indlæst ({status}, {len(self.entries)} entries) "
+            f"på {time.perf_counter() - start:.3f}s"
+        )
         if self.errors:
             print(f"Advarsel: Der blev fundet {len(self.errors)} fejl i regnskabet!")
 
-    def execute(self, bql_query):
-        """Eksekverer en BQL-forespørgsel (Beancount Query Language)."""
-        column_names, row_tuples = query.run_query(
-            self.entries, self.options, bql_query
-        )
-        return row_tuples
+    def _read_cache(self):
+        """Returnerer (entries, errors, options) fra cachen hvis ingen inkluderede filer er ændret."""
+        if not path.exists(self.cache_filename):
+            return None
+        try:
+            with open(self.cache_filename, "rb") as f:
+                input_hash, entries, errors, options = pickle.load(f)
+        except Exception:
+            # gammel eller ødelagt cachefil; den overskrives ved næste indlæsning
+            return None
+        # include-stierne er absolutte; en kopieret firmamappe maa ikke bruge dem
+        if options["filename"] != path.abspath(self.filename):
+            return None
+        if input_hash != include_tree_hash(options["include"]):
+            return None
+        return entries, errors, options
+
+    def _write_cache(self):
+        input_hash = include_tree_hash(self.options["include"])
+        tmp_filename = f"{self.cache_filename}.tmp"
+        try:
+            with open(tmp_filename, "wb") as f:
+                pickle.dump(
+                    (input_hash, self.entries, self.errors, self.options),
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp_filename, self.cache_filename)
+        except OSError as e:
+            print(f"Advarsel: Kunne ikke skrive cachefil {self.cache_filename}: {e}")
 
-    def commit_entry(self, entry):
+    def commit_entry(self, entry, verify=False):
         """Skriver en ny transaktion/entry direkte til bunden af filen."""
+        return self.commit_entries([entry], verify=verify)
+
+    def commit_entries(self, entries, verify=False):
+        """Skriver flere entries til bunden af filen i én append.
+
+        Som standard indsættes de nye entries sorteret i de indlæste `entries`
+        og kun de valideringer der berører dem køres (også balance-assertions
+        på de berørte konti efter den tidligste nye entry), i stedet for at hele
+        regnskabet genindlæses. Entries skal derfor være fuldt bogførte (ingen
+        manglende beløb). Med verify=True genindlæses og valideres hele
+        regnskabet i stedet (langsommere). Returnerer fejl fundet i de nye entries.
+        """
+        entries = data.sorted(entries)
+        buffer = io.StringIO()
+        for entry in entries:
+            buffer.write("\n")
+            printer.print_entry(entry, file=buffer)
         with open(self.filename, "a", encoding="utf-8") as f:
-            f.write("\n")
-            printer.print_entry(entry, file=f)
-        self.refresh()  # Opdater hukommelsen efter skrivning
-
-    def _in_period(self, qry, converter=None, start_date=None, end_date=None):
-        res = [(d, amount) for d, amount in self.execute(qry)]
-        if converter:
-            res = [(d, converter(amount)) for d, amount in res]
-        if start_date:
-            res = [x for x in res if x[0] >= start_date]
-        if end_date:
-            res = [x for x in res if x[0] <= end_date]
-        return res
+            f.write(buffer.getvalue())
 
-    def account_in_period(self, account, start_date, end_date):
-        return self._in_period(
-            f"SELECT date, units(position) WHERE account ~ '{account}' ORDER BY date ASC",
-            lambda x: x.number,
-            start_date=start_date,
-            end_date=end_date,
+        if verify:
+            errors_before = len(self.errors)
+            self.refresh()
+            return self.errors[errors_before:]
+
+        errors = self._validate_new_entries(entries)
+        for entry in entries:
+            insort(self.entries, entry, key=data.entry_sortkey)
+        self._index = None
+        self.errors.extend(errors)
+        if errors:
+            print(f"Advarsel: {len(errors)} fejl i nye entries!")
+        return errors
+
+    def _validate_new_entries(self, entries):
+        """Kører de valideringer der kan påvirkes af nye entries.
+
+        Valideringerne af konti køres kun på nye entries samt open/close
+        entries for de konti de refererer til. Balance-assertions på de
+        berørte konti og deres overkonti, dateret fra den tidligste nye entry,
+        tjekkes igen mod alle transaktioner på de asserterede konti.
+        """
+        accounts = set()
+        for entry in entries:
+            accounts.update(getters.get_entry_accounts(entry))
+        open_close = [
+            entry
+            for entry in self.entries
+            if isinstance(entry, (data.Open, data.Close)) and entry.account in accounts
+        ]
+        subset = data.sorted(open_close + entries)
+        new_ids = set(id(entry) for entry in entries)
+        errors = []
+        for validate in (
+            validation.validate_active_accounts,
+            validation.validate_currency_constraints,
+        ):
+            errors += [
+                e for e in validate(subset, self.options) if id(e.entry) in new_ids
+            ]
+        errors += validation.validate_check_transaction_balances(entries, self.options)
+        errors += self._check_balances(entries, accounts)
+        return errors
+
+    def _check_balances(self, entries, accounts):
+        """Balance-fejl som de nye entries giver i assertions der bestod før."""
+        first_date = min(entry.date for entry in entries)
+        asserted = set(
+            entry.account
+            for entry in self.entries
+            if isinstance(entry, data.Balance)
+            and entry.date >= first_date
+            and entry.diff_amount is None
+            and any(
+                a == entry.account or has_component(a, entry.account) for a in accounts
+            )
         )
+        if not asserted:
+            return []
+        matchers = [parent_matcher(a) for a in asserted]
+
+        def is_asserted(name):
+            return any(match(name) for match in matchers)
+
+        subset = [
+            entry
+            for entry in self.entries
+            if (
+                isinstance(entry, data.Transaction)
+                and any(is_asserted(posting.account) for posting in entry.postings)
+            )
+            or (isinstance(entry, data.Open) and entry.account in asserted)
+            or (
+                isinstance(entry, data.Balance)
+                and entry.account in asserted
+                and entry.diff_amount is None
+            )
+        ]
+        _, errors = balance.check(data.sorted(subset + entries), self.options)
+        # fejl der allerede blev fundet ved indlæsningen rapporteres ikke igen
+        known = set(_error_key(e) for e in self.errors)
+        return [
+            e
+            for e in errors
+            if e.entry.date >= first_date and _error_key(e) not in known
+        ]
+
+    @property
+    def index(self):
+        """Posteringsindeks for den aktuelle snapshot; bygges ved første opslag."""
+        if self._index is None:
+            with profiling.stage("beancount.index") as st:
+                self._index = PostingIndex(self.entries)
+                st.add(len(self.entries))
+        return self._index
+
+    def account_in_period(self, account, start_date, end_date):
+        series = self.index.get(account)
+        lo, hi = series.bounds(start_date, end_date)
+        return list(zip(series.dates[lo:hi], series.numbers[lo:hi]))
 
     def account_sum_in_period(self, account, start_date, end_date):
-        return sum(
-            [a for d, a in self.account_in_period(account, start_date, end_date)]
-        )
+        series = self.index.get(account)
+        lo, hi = series.bounds(start_date, end_date)
+        return series.balances[hi] - series.balances[lo]
+
+    def account_balance_before(self, account, start_date):
+        """Saldoen før start_date."""
+        series = self.index.get(account)
+        lo, hi = series.bounds(start_date, None)
+        return series.balances[lo]
 
     def account_balance_in_period(self, account, start_date, end_date):
-        return self._in_period(
-            f"SELECT date, units(balance) WHERE account ~ '{account}' ORDER BY date ASC",
-            lambda x: x.get_only_position().units.number,
-            start_date=None,
-            end_date=None,
-        )
+        series = self.index.get(account)
+        lo, hi = series.bounds(start_date, end_date)
+        return list(zip(series.dates[lo:hi], series.balances[lo + 1 : hi + 1]))
 
     def get_moms_status(self, start_date, end_date):
         return self.account_in_period("SkyldigMoms", None, start_date, end_date)
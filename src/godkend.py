@@ -1,6 +1,31 @@
+from os import path
+from snapshot import SnapshotStore, diff_manifests
+import util
+
+
 def handle_godkend(ctx):
+    print(f"Godkendelse for {ctx.company_name} (enddate {ctx.enddate})")
+    store = SnapshotStore(ctx.company_path)
+    previous = store.latest()
+    if previous and previous["enddate"] > util.format_date(ctx.enddate):
+        print(f"Fejl: der er allerede godkendt pr. {previous['enddate']}")
+        return
+
+    manifest, new_blobs = store.snapshot(ctx.enddate)
+    added, removed, changed = diff_manifests(previous, manifest)
+    if previous:
+        print(
+            f"Ændringer siden godkendelsen pr. {previous['enddate']}:"
+            + (not (added or removed or changed) and " ingen" or "")
+        )
+    for label, filenames in (
+        ("Nye", added),
+        ("Fjernede", removed),
+        ("Ændrede", changed),
+    ):
+        if filenames:
+            print(f"{label}:", filenames)
     print(
-        f"Godkendelse for {ctx.company_name} (periode {ctx.period}, enddate {ctx.enddate})"
+        f"Godkendt pr. {manifest['enddate']}: {len(manifest['files'])} filer, "
+        f"{new_blobs} nye gemt i {path.relpath(store.path, ctx.company_path)}"
     )
-    # TODO: Implement blueprint logic for godkend
-    print("Logic not yet implemented according to blueprint.")
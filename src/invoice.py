@@ -0,0 +1,270 @@
+import hashlib
+import os
+import re
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import date
+from decimal import Decimal
+from os import path
+import constants as const
+import util
+from transaction import salg_lines
+
+INVOICE_TEMPLATE = "faktura.html"
+INVOICE_CSS = "faktura.css"
+# fakturanumre og hash af fakturaernes input i periodens bilag-mappe
+INVOICE_MANIFEST = ".fakturaer.json"
+
+# stylesheet og fonte indlaeses een gang pr. worker og deles af alle fakturaer
+_worker_css = None
+_worker_font_config = None
+
+
+@dataclass(slots=True)
+class InvoiceLine:
+    text: str
+    quantity: Decimal
+    price: Decimal
+
+    @property
+    def amount(self):
+        return self.quantity * self.price
+
+
+@dataclass(slots=True)
+class Invoice:
+    # identificerer salget uafhaengigt af linjens placering i salg.txt
+    key: str
+    invoice_date: date
+    customer: str
+    period_txt: str
+    lines: list[InvoiceLine] = field(default_factory=list)
+    number: str | None = None
+
+    @property
+    def amount_wo_vat(self):
+        return sum((line.amount for line in self.lines), Decimal(0))
+
+    @property
+    def vat(self):
+        return self.amount_wo_vat * const.VAT_PCT
+
+    @property
+    def total(self):
+        return self.amount_wo_vat + self.vat
+
+    @property
+    def filename(self):
+        return f"faktura-{self.number}.pdf"
+
+    @property
+    def as_dict(self):
+        return {
+            "number": self.number,
+            "invoice_date": util.format_date(self.invoice_date),
+            "customer": self.customer,
+            "period_txt": self.period_txt,
+            "lines": [
+                {
+                    "text": line.text,
+                    "quantity": line.quantity,
+                    "price": util.format_money(line.price),
+                    "amount": util.format_money(line.amount),
+                }
+                for line in self.lines
+            ],
+            "amount_wo_vat": util.format_money(self.amount_wo_vat),
+            "vat_pct": int(const.VAT_PCT * 100),
+            "vat": util.format_money(self.vat),
+            "total": util.format_money(self.total),
+        }
+
+    @staticmethod
+    def from_salg_csv(rows, ctx, errors=None):
+        """Fakturaer for salg.txt uden fakturanumre, jf. assign_numbers.
+
+        Linjer uden priser springes over og samles i errors; uden errors
+        rejses en ValueError med alle manglende priser.
+        """
+        result = []
+        missing = []
+        seen = {}
+        for line in salg_lines(rows, ctx, missing):
+            key = f"{line.yymmdd};{line.account_name};{line.period_txt}"
+            # samme kunde, dato og periodetekst flere gange
+            seen[key] = seen.get(key, 0) + 1
+            if seen[key] > 1:
+                key += f";{seen[key]}"
+            invoice = Invoice(
+                key=key,
+                invoice_date=line.date_posted.date(),
+                customer=line.account_name,
+                period_txt=line.period_txt,
+            )
+            invoice.lines.append(InvoiceLine("Timer", line.hours, line.hour_price))
+            if line.has_support:
+                invoice.lines.append(
+                    InvoiceLine("Support", line.support_hours, line.support_price)
+                )
+            result.append(invoice)
+        if missing and errors is None:
+            raise ValueError("Manglende priser:\n%s" % ("\n".join(missing),))
+        if errors is not None:
+            errors += missing
+        return result
+
+
+def assign_numbers(invoices, period, manifest, bilag_path):
+    """Giver fakturaerne løbenumre fra periodens manifest.
+
+    En faktura beholder sit nummer når salg.txt rettes eller sorteres om;
+    nye salg får næste nummer, og et nummer bruges aldrig to gange.
+    """
+    numbers = manifest.setdefault("numbers", {})
+    next_number = manifest.get("next_number") or next_free_number(bilag_path, period)
+    for invoice in invoices:
+        if invoice.key not in numbers:
+            numbers[invoice.key] = next_number
+            next_number += 1
+        invoice.number = f"{period}-{numbers[invoice.key]:03d}"
+    manifest["next_number"] = next_number
+
+
+def next_free_number(bilag_path, period):
+    """Nummeret efter de PDF'er der allerede ligger i bilag-mappen."""
+    pattern = re.compile(r"^faktura-%s-(\d+)\.pdf$" % (re.escape(period),))
+    numbers = [
+        int(m.group(1))
+        for m in map(pattern.match, os.listdir(bilag_path))
+        if m is not None
+    ]
+    return max(numbers, default=0) + 1
+
+
+def pdf_error():
+    """Fejlen hvis weasyprint (og dermed pango) ikke kan indlæses, ellers None."""
+    try:
+        import weasyprint  # noqa: F401
+    except (ImportError, OSError) as e:
+        return f"PDF-fakturaer kræver weasyprint og pango: {e}"
+    return None
+
+
+def _init_worker(css_filename):
+    global _worker_css, _worker_font_config
+    from weasyprint import CSS
+    from weasyprint.text.fonts import FontConfiguration
+
+    _worker_font_config = FontConfiguration()
+    _worker_css = CSS(filename=css_filename, font_config=_worker_font_config)
+
+
+def render_pdf(html, filename, base_url):
+    """Skriver html som PDF via en midlertidig fil; kører i en worker."""
+    from weasyprint import HTML
+
+    start = time.perf_counter()
+    dirname = path.dirname(filename)
+    fd, tmp_filename = tempfile.mkstemp(dir=dirname, suffix=".tmp")
+    os.close(fd)
+    try:
+        HTML(string=html, base_url=base_url).write_pdf(
+            tmp_filename,
+            stylesheets=[_worker_css],
+            font_config=_worker_font_config,
+        )
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+    return time.perf_counter() - start
+
+
+def invoice_template(ctx):
+    from jinja2 import Environment, FileSystemLoader
+
+    env = Environment(loader=FileSystemLoader(ctx.templates_path), autoescape=True)
+    return env.get_template(INVOICE_TEMPLATE)
+
+
+def generate_invoices(ctx, periods, jobs=1, force=False, errors=None):
+    """Danner PDF-fakturaer for salg i perioderne i en procespulje.
+
+    HTML renderes i denne proces; en PDF dannes kun hvis hash af dens HTML
+    og stylesheet er ændret siden sidst. force danner alle PDF'er igen, men
+    fakturanumrene bevares. Salg uden priser samles i errors, jf.
+    Invoice.from_salg_csv. Returnerer de dannede filnavne.
+    """
+    template = invoice_template(ctx)
+    css_filename = path.join(ctx.templates_path, INVOICE_CSS)
+    css_hash = util.file_hash(css_filename)
+
+    pending = []
+    manifests = {}
+    for period in periods:
+        bilag_path = ctx.company_period_path(period, const.BILAG_DIR)
+        manifest_filename = path.join(bilag_path, INVOICE_MANIFEST)
+        manifest = util.load_json(manifest_filename, {})
+        if force:
+            manifest.pop("hashes", None)
+        hashes = manifest.setdefault("hashes", {})
+        manifests[manifest_filename] = manifest
+        os.makedirs(bilag_path, exist_ok=True)
+        invoices = [
+            invoice
+            for invoice in Invoice.from_salg_csv(ctx.get_salg_csv(period), ctx, errors)
+            if invoice.invoice_date <= ctx.enddate
+        ]
+        assign_numbers(invoices, period, manifest, bilag_path)
+        for invoice in invoices:
+            html = template.render(invoice.as_dict, company_name=ctx.company_name)
+            input_hash = hashlib.sha256(
+                f"{css_hash}\n{html}".encode("utf-8")
+            ).hexdigest()
+            filename = path.join(bilag_path, invoice.filename)
+            if hashes.get(invoice.number) == input_hash and path.exists(filename):
+                continue
+            hashes[invoice.number] = input_hash
+            pending.append((html, filename))
+
+    print(f"Fakturaer der dannes: {len(pending)}")
+    if pending:
+        start = time.perf_counter()
+        with ProcessPoolExecutor(
+            max_workers=max(1, min(jobs, len(pending))),
+            initializer=_init_worker,
+            initargs=(css_filename,),
+        ) as executor:
+            list(
+                executor.map(
+                    render_pdf,
+                    [html for html, filename in pending],
+                    [filename for html, filename in pending],
+                    [ctx.templates_path] * len(pending),
+                )
+            )
+        print(
+            f"{len(pending)} PDF'er dannet på {time.perf_counter() - start:.2f}s "
+            f"med {jobs} processer"
+        )
+    # manifesterne skrives foerst naar alle PDF'er er dannet
+    for manifest_filename, manifest in manifests.items():
+        util.write_json(manifest_filename, manifest)
+    return [filename for html, filename in pending]
+
+
+def handle_faktura(ctx, jobs=1, force=False):
+    """Danner fakturaerne; returnerer fejl."""
+    print(f"Fakturering for {ctx.company_name} (enddate {ctx.enddate})")
+    # fejler tydeligt her i stedet for i pool'ens workers
+    error = pdf_error()
+    if error is not None:
+        print(error)
+        return [error]
+    errors = []
+    generate_invoices(ctx, ctx.periods, jobs=jobs, force=force, errors=errors)
+    for error in errors:
+        print(error)
+    return errors
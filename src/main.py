@@ -1,9 +1,4 @@
 import argparse
-from opdater import handle_opdater
-from afstem import handle_afstem
-from godkend import handle_godkend
-from moms_luk import handle_moms_luk
-from status import handle_status
 
 
 def main():
@@ -16,18 +11,35 @@ def main():
     #     "--periode", default="", help="Regnskabsperiode/år (default: '2021')"
     # )
     parent_parser.add_argument(
-        "--enddate", default="", help="Slutdato for perioden (format: YYMMDD)"
+        "--enddate", default="", help="Slutdato for perioden (format: YYYYMMDD)"
+    )
+    parent_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Vis tid pr. trin (også LEDGER_PROFILE=1; LEDGER_PROFILE_DUMP=mappe "
+        "gemmer cProfile og tracemalloc)",
     )
 
     parser = argparse.ArgumentParser(description="Ledger CLI - Dansk Bogføringssystem")
     subparsers = parser.add_subparsers(dest="command", help="Tilgængelige kommandoer")
 
     # Subcommand: opdater
-    subparsers.add_parser(
+    opdater_parser = subparsers.add_parser(
         "opdater",
         parents=[parent_parser],
         help="Opdater beancount filer",
     )
+    opdater_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Antal processer perioderne dannes i (default: 1)",
+    )
+    opdater_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Dan alle perioder, også dem hvis input er uændret",
+    )
 
     # Subcommand: afstem
     subparsers.add_parser(
@@ -46,23 +58,109 @@ def main():
     subparsers.add_parser(
         "status", parents=[parent_parser], help="Vis status/rapporter"
     )
+    # Subcommand: faktura
+    faktura_parser = subparsers.add_parser(
+        "faktura",
+        parents=[parent_parser],
+        help="Dan PDF-fakturaer fra salg.txt (kræver weasyprint)",
+    )
+    faktura_parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Antal processer PDF'erne dannes i (default: 1)",
+    )
+    faktura_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Dan alle fakturaer, også dem hvis input er uændret",
+    )
+    # Subcommand: watch
+    watch_parser = subparsers.add_parser(
+        "watch",
+        parents=[parent_parser],
+        help="Kør opdater hver gang input i perioder eller stamdata ændres",
+    )
+    watch_parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Sekunder mellem hver kontrol af filerne (default: 1)",
+    )
+    # Subcommand: batch
+    batch_parser = subparsers.add_parser(
+        "batch", help="Kør kommandoer for flere firmaer i parallelle processer"
+    )
+    batch_parser.add_argument(
+        "firmaer", nargs="+", help="Firma-mapper eller glob-mønstre, fx 'firmaer/*'"
+    )
+    batch_parser.add_argument(
+        "--kommando",
+        nargs="+",
+        choices=["opdater", "afstem", "moms-luk"],
+        default=["opdater"],
+        help="Kommandoer der køres pr. firma i rækkefølge (default: opdater)",
+    )
+    batch_parser.add_argument(
+        "--enddate", required=True, help="Slutdato for perioden (format: YYYYMMDD)"
+    )
+    batch_parser.add_argument(
+        "--jobs", type=int, default=1, help="Antal processer (default: 1)"
+    )
+    batch_parser.add_argument(
+        "--verbose", action="store_true", help="Vis output fra alle firmaer"
+    )
 
     args = parser.parse_args()
 
+    if args.command == "batch":
+        from batch import handle_batch
+
+        handle_batch(args.firmaer, args.enddate, args.kommando, args.jobs, args.verbose)
+        return
+
+    import profiling
     from context import LedgerContext
 
+    profiling.enable_from_env(getattr(args, "profile", False))
     ctx = LedgerContext(company_name=args.firma, enddate=args.enddate)
 
+    try:
+        run_command(parser, args, ctx)
+    finally:
+        profiling.report()
+
+
+def run_command(parser, args, ctx):
+    # kommandomodulerne importeres foerst naar kommandoen er valgt
     if args.command == "afstem":
+        from afstem import handle_afstem
+
         handle_afstem(ctx)
     elif args.command == "godkend":
+        from godkend import handle_godkend
+
         handle_godkend(ctx)
     elif args.command == "moms-luk":
+        from moms_luk import handle_moms_luk
+
         handle_moms_luk(ctx)
     elif args.command == "status":
+        from status import handle_status
+
         handle_status(ctx)
     elif args.command == "opdater":
-        handle_opdater(ctx)
+        from opdater import handle_opdater
+
+        handle_opdater(ctx, jobs=args.jobs, force=args.force)
+    elif args.command == "faktura":
+        from invoice import handle_faktura
+
+        handle_faktura(ctx, jobs=args.jobs, force=args.force)
+    elif args.command == "watch":
+        from watch import handle_watch
+
+        handle_watch(ctx, interval=args.interval)
     else:
         parser.print_help()
 
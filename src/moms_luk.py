@@ -1,29 +1,35 @@
 from datetime import date
+import profiling
 import util
 from decimal import Decimal
 import constants as const
 
 
 def handle_moms_luk(ctx):
+    """Lukker momsen for halvåret til enddate; returnerer fejl."""
     print(f"Moms-lukning for {ctx.company_name} enddate {ctx.enddate})")
-    bc = ctx.get_connection()
+    with profiling.stage("moms_luk.regnskab"):
+        bc = ctx.get_connection()
 
     SKYLDIG_MOMS = "Liabilities:Moms:SkyldigMoms"
 
     # vi skal checke at der ikke er aabne SKYLDIG_MOMS transaktioner
-    transactions = bc.account_in_period(SKYLDIG_MOMS, date(1900, 1, 1), ctx.enddate)
+    with profiling.stage("moms_luk.saldi"):
+        transactions = bc.account_in_period(SKYLDIG_MOMS, date(1900, 1, 1), ctx.enddate)
     diff = sum([amount for acc, amount in transactions])
     if diff != 0:
-        print(f"SKYLDIG_MOMS konto er ikke i nul. Diff: {diff}")
-        return
+        error = f"SKYLDIG_MOMS konto er ikke i nul. Diff: {diff}"
+        print(error)
+        return [error]
 
     # saa skal vi have fat i koebs og salgs moms i periode
     start_date = util.first_day_of_month(util.add_months(ctx.enddate, -5))
     print(start_date)
-    totals = [
-        bc.account_sum_in_period(a, start_date, ctx.enddate)
-        for a in ["Assets:Moms:KoebMoms", "Liabilities:Moms:SalgMoms"]
-    ]
+    with profiling.stage("moms_luk.saldi"):
+        totals = [
+            bc.account_sum_in_period(a, start_date, ctx.enddate)
+            for a in ["Assets:Moms:KoebMoms", "Liabilities:Moms:SalgMoms"]
+        ]
     totals = [Decimal(t and t or Decimal(0)) for t in totals]
 
     # eksempel: købsmoms=2.36, salgsmoms=3.67
@@ -56,3 +62,4 @@ def handle_moms_luk(ctx):
         ),
     )
     # saa skal vi have fat i koeb og salg i perioden
+    return []
@@ -1,20 +1,203 @@
+import hashlib
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from os import path
 from transaction import Transaction
 from bank_transaction import BankTransaction
+from aggregates import AggregateTable
+from bank_index import BankLineIndex, bank_fingerprint
 import constants as const
+import profiling
 import util
 from context import LedgerContext
 
+# context i worker-processer ved opdater --jobs
+_worker_ctx = None
 
-def handle_opdater(ctx):
+
+def _init_worker(company_name, enddate, root_path, profile):
+    global _worker_ctx
+    if profile:
+        profiling.enable()
+    _worker_ctx = LedgerContext(
+        company_name=company_name, enddate=enddate, root_path=root_path
+    )
+
+
+def staging_path(ctx, period):
+    """Mappe en worker skriver periodens filer i foer de flyttes til generated/."""
+    return path.join(ctx.company_generated_path, f".opdater{period}")
+
+
+def _opdater_period_in_worker(period, duplicates):
+    # perioden skrives i en staging-mappe; hovedprocessen flytter filerne paa
+    # plads i periodeorden, saa generated/ bliver som ved en seriel koersel
+    # ogsaa naar en tidligere periode fejler
+    staging = staging_path(_worker_ctx, period)
+    os.makedirs(staging, exist_ok=True)
+    _worker_ctx.company_generated_path = staging
+    try:
+        result = opdater_period(_worker_ctx, period, duplicates)
+    finally:
+        del _worker_ctx.company_generated_path
+    # workerens trin sendes med tilbage og laegges til i hovedprocessen
+    return result, profiling.take()
+
+
+def move_staged_files(ctx, period, files):
+    """Flytter en workers filer fra staging-mappen til generated/."""
+    staging = staging_path(ctx, period)
+    for filename in files:
+        full_filename = path.join(ctx.company_generated_path, filename)
+        ctx._track_change(
+            full_filename,
+            util.move_if_changed(path.join(staging, filename), full_filename),
+        )
+
+
+def _merge_worker_profiles(results):
+    for result, stages in results:
+        profiling.merge(stages)
+        yield result
+
+
+def handle_opdater(ctx, jobs=1, force=False):
+    # perioder hvis input er uaendret siden sidste koersel genbruges fra manifest
+    with profiling.stage("opdater.bank_index"):
+        bank_index = BankLineIndex.load(ctx)
+        duplicates = dict(
+            (
+                period,
+                dict(
+                    (filename, bank_index.duplicates(period, filename))
+                    for account, filename in ctx.bank_accounts
+                ),
+            )
+            for period in ctx.periods
+        )
+    with profiling.stage("opdater.manifest"):
+        manifest = {} if force else ctx.load_generated_manifest()
+        input_hashes = dict(
+            (period, ctx.period_input_hash(period)) for period in ctx.periods
+        )
+        # dubletter afhaenger af tidligere perioders bankfiler
+        for period, period_duplicates in duplicates.items():
+            parts = [input_hashes[period]]
+            for filename, fingerprints in period_duplicates.items():
+                if fingerprints:
+                    parts += [filename] + sorted(fingerprints)
+            if len(parts) > 1:
+                input_hashes[period] = hashlib.sha256(
+                    "\n".join(parts).encode("utf-8")
+                ).hexdigest()
     kontoplan_accounts = []
+    periods = []
     for period in ctx.periods:
-        # process each row in bank_csv
-        errors = []
-        bank_to_invoice_date = ctx.get_bank_to_invoice_date(period)
-        bank_transactions = BankTransaction.from_bank_csv(ctx.get_bank_csv(period))
-        transactions = []
-        for bank_transaction in reversed(bank_transactions):
+        cached = manifest.get(period)
+        if (
+            cached
+            and cached["input_hash"] == input_hashes[period]
+            and all(
+                path.exists(path.join(ctx.company_generated_path, fn))
+                for fn in cached["files"]
+            )
+        ):
+            kontoplan_accounts += cached["accounts"]
+        else:
+            periods.append(period)
+    print("Perioder der dannes:", periods)
+    if periods:
+        errors = ctx.validate_resolved_accounts()
+        if errors:
+            print("\n".join(errors))
+            return errors
+
+    if jobs > 1 and len(periods) > 1:
+        executor = ProcessPoolExecutor(
+            max_workers=jobs,
+            initializer=_init_worker,
+            initargs=(
+                ctx.company_name,
+                ctx.enddate,
+                ctx.root_path,
+                profiling.is_enabled(),
+            ),
+        )
+        results = _merge_worker_profiles(
+            executor.map(
+                _opdater_period_in_worker,
+                periods,
+                [duplicates[period] for period in periods],
+            )
+        )
+    else:
+        executor = None
+        results = (
+            opdater_period(ctx, period, duplicates[period]) for period in periods
+        )
+
+    # resultaterne behandles i fast raekkefoelge, saa kontoplan, manifest og
+    # generated/ bliver de samme som ved en seriel koersel
+    try:
+        for period, (files, accounts, errors, changed) in zip(periods, results):
+            if errors:
+                print("\n".join(errors))
+                return errors
+            if executor:
+                move_staged_files(ctx, period, files)
+            kontoplan_accounts += accounts
+            manifest[period] = {
+                "input_hash": input_hashes[period],
+                "files": files,
+                "accounts": sorted(set(accounts)),
+            }
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+            # senere perioders filer kasseres efter en fejl
+            for period in periods:
+                shutil.rmtree(staging_path(ctx, period), ignore_errors=True)
+        ctx.write_generated_manifest(manifest)
+        bank_index.write(ctx)
+
+    # opdater kontoplan fil
+    with profiling.stage("opdater.kontoplan"):
+        ctx.write_company_kontoplan_file(
+            ["1900-01-01 open %s DKK" % (x,) for x in sorted(set(kontoplan_accounts))],
+        )
+    print(
+        "Ændrede filer:",
+        [path.relpath(fn, ctx.company_path) for fn in ctx.changed_files],
+    )
+    # en eksisterende aggregat-tabel (fra status) holdes opdateret
+    if ctx.changed_files and path.exists(AggregateTable.path(ctx)):
+        with profiling.stage("opdater.aggregater"):
+            AggregateTable.load(ctx)
+    return []
+
+
+def bank_account_transactions(
+    ctx, bank_account, bank_rows, bank_transactions, seen, bank_to_invoice_date, errors
+):
+    """Posteringer for en bankfils linjer, bogført på bank_account.
+
+    Linjer hvis fingeraftryk er i seen springes over, og de øvrige tilføjes
+    seen. Fejl tilføjes errors. Returnerer (posteringer, antal oversprungne).
+    """
+    matched = []
+    skipped = 0
+    with profiling.stage("opdater.match") as st:
+        for row, bank_transaction in zip(
+            reversed(bank_rows), reversed(bank_transactions)
+        ):
+            fingerprint = bank_fingerprint(row)
+            if fingerprint in seen:
+                skipped += 1
+                continue
+            seen.add(fingerprint)
+
             # match account
             desc = bank_transaction.description.casefold()
 
@@ -22,52 +205,35 @@ def handle_opdater(ctx):
             if bank_row_key in bank_to_invoice_date:
                 account_match = bank_to_invoice_date[bank_row_key][const.ACCOUNT_NAME]
             else:
-                account_matches = [
-                    (a, srch_str)
-                    for a, regex, srch_str in ctx.account_regexes
-                    if srch_str in desc
-                ]
-                if len(account_matches) == 0:
+                # vi tager den med bedste (laengste) match
+                account_match = ctx.account_matcher.match(desc)
+                if account_match is None:
                     errors.append("Ingen matches for %s" % (desc,))
                     continue
 
-                account_matches = list(set(account_matches))
-                if len(account_matches) > 1:
-                    # vi tager den med bedste match
-                    account_matches.sort(key=lambda x: -len(x[1]))
-                    # print(account_matches)
-                account_match = account_matches[0][0]
-
-            if account_match.casefold() not in ctx.all_accounts:
+            # konto og transaktionstype er slaaet op een gang pr. kontekst
+            resolved = ctx.resolved_accounts.get(account_match.casefold())
+            if resolved is None:
                 errors.append(
                     "Konto %s (matchet fra %s) findes ikke i ctx.all_accounts"
                     % (account_match, desc)
                 )
                 continue
-
-            full_account_name = ctx.all_accounts[account_match.casefold()][1]
-            account_name = full_account_name.split(":")[-1]
-            account_group = ctx.all_accounts[account_match.casefold()][0]
-
-            # transaktionstype hvor der foerst ses om der er en tilknyttet account_group og herefter account:_name
-            account_group_split = account_group.split(":")
-            for i in reversed(range(len(account_group_split))):
-                tmp = ":".join(account_group_split[:i])
-                if tmp in ctx.transaction_types:
-                    transaction_type = ctx.transaction_types[tmp]
-                    break
-
-            if not transaction_type:
-                print(
-                    account_group,
-                    account_name,
-                    util.combined_account(account_name, account_group),
-                )
+            if resolved.transaction_type is None:
                 errors.append(
-                    "Ingen transaktionstype for %s %s" % (account_group, account_name)
+                    "Ingen transaktionstype for %s %s"
+                    % (resolved.account_group, resolved.account_name)
                 )
                 continue
+            matched.append((bank_transaction, resolved))
+        st.add(len(bank_transactions))
 
+    transactions = []
+    with profiling.stage("opdater.bank_posteringer") as st:
+        for bank_transaction, resolved in matched:
+            full_account_name = resolved.full_account_name
+            account_name = resolved.account_name
+            transaction_type = resolved.transaction_type
             antal_posteringer = transaction_type[const.ANTAL_POSTERINGER]
             med_moms = transaction_type[const.MED_MOMS] > 0
 
@@ -96,105 +262,148 @@ def handle_opdater(ctx):
                 extra_text="CCC",
                 amount=bank_transaction.amount,
                 account1=account1,
-                account2=f"Assets:Bank:BankErhverv",
+                account2=bank_account,
                 template_name=const.UDEN_MOMS,
             )
             transactions.append(transaction)
-        if errors:
-            print("\n".join(errors))
-            return
-
-        # transaktioner
-        ctx.render_period_transactions(period, transactions)
-
-        salg_output = Transaction.from_salg_csv(ctx.get_salg_csv(period), ctx)
-        ctx.render_transactions(period, "salg", salg_output)
-
-        udbytte_output = []
-        for row in ctx.get_udbytte_csv(period):
-            date_posted = datetime(int(period), 12, 31)
-            total = util.parse_amount(row[const.UDBYTTE], const.DOT)
-            tax_pct = util.parse_amount(row[const.UDBYTTE_SKAT_PCT], const.DOT)
-            amount_tax = total * tax_pct
-            amount_owner = total - amount_tax
-
-            for acc1, acc2, amount in (
-                (
-                    "Liabilities:Dividend-Payable:UdbytteSkat",
-                    "Equity:Retained-Earnings",
-                    amount_tax,
-                ),
-                (
-                    "Liabilities:Dividend-Payable:UdbytteEjer",
-                    "Equity:Retained-Earnings",
-                    amount_owner,
-                ),
-            ):
-                udbytte_output.append(
-                    Transaction(
-                        date_posted=date_posted,
-                        text="Generalforsamling",
-                        extra_text=f"Vedtaget udbytte for {period}",
-                        amount=amount,
-                        account1=acc1,
-                        account2=acc2,
-                        template_name=const.UDEN_MOMS,
-                    )
+        st.add(len(matched))
+    return transactions, skipped
+
+
+def opdater_period(ctx, period, duplicates=None):
+    """Danner posteringer for en periode.
+
+    Periodens filer skrives til generated/ hvis der ikke er fejl. Returnerer
+    (filnavne, konti, fejl, aendrede), hvor konti er de konti posteringerne
+    bruger og aendrede er de filer hvis indhold faktisk blev aendret.
+    Perioderne skriver kun egne filer, saa de kan dannes i separate processer.
+    Bankfilerne er dem i ctx.bank_accounts, og posteringerne bogføres på
+    filens bankkonto. Banklinjer med fingeraftryk i duplicates[fil] (fra
+    tidligere perioder) eller som allerede er set i filen springes over.
+    """
+    changed_before = len(ctx.changed_files)
+    # process each row in bank_csv
+    errors = []
+    with profiling.stage("opdater.bank_csv") as st:
+        bank_to_invoice_date = ctx.get_bank_to_invoice_date(period)
+        bank_files = []
+        for bank_account, filename in ctx.bank_accounts:
+            # en bankkonto kan vaere oprettet efter periodens start
+            if not path.exists(ctx.company_period_path(period, filename)):
+                continue
+            bank_rows = list(ctx.get_bank_csv(period, filename))
+            bank_transactions = BankTransaction.from_bank_csv(bank_rows)
+            bank_files.append((bank_account, filename, bank_rows, bank_transactions))
+            st.add(len(bank_transactions))
+    transactions = []
+    skipped = 0
+    for bank_account, filename, bank_rows, bank_transactions in bank_files:
+        account_transactions, account_skipped = bank_account_transactions(
+            ctx,
+            bank_account,
+            bank_rows,
+            bank_transactions,
+            set((duplicates or {}).get(filename, ())),
+            bank_to_invoice_date,
+            errors,
+        )
+        transactions += account_transactions
+        skipped += account_skipped
+    if skipped:
+        print(f"Dublerede banklinjer sprunget over i {period}: {skipped}")
+    with profiling.stage("opdater.salg") as st:
+        salg_output = Transaction.from_salg_csv(ctx.get_salg_csv(period), ctx, errors)
+        st.add(len(salg_output))
+
+    if errors:
+        return [], [], errors, []
+
+    # transaktioner
+    files = [ctx.render_period_transactions(period, transactions)]
+
+    files.append(ctx.render_transactions(period, "salg", salg_output))
+
+    udbytte_output = []
+    for row in ctx.get_udbytte_csv(period):
+        date_posted = datetime(int(period), 12, 31)
+        total = util.parse_amount(row[const.UDBYTTE], const.DOT)
+        tax_pct = util.parse_amount(row[const.UDBYTTE_SKAT_PCT], const.DOT)
+        amount_tax = total * tax_pct
+        amount_owner = total - amount_tax
+
+        for acc1, acc2, amount in (
+            (
+                "Liabilities:Dividend-Payable:UdbytteSkat",
+                "Equity:Retained-Earnings",
+                amount_tax,
+            ),
+            (
+                "Liabilities:Dividend-Payable:UdbytteEjer",
+                "Equity:Retained-Earnings",
+                amount_owner,
+            ),
+        ):
+            udbytte_output.append(
+                Transaction(
+                    date_posted=date_posted,
+                    text="Generalforsamling",
+                    extra_text=f"Vedtaget udbytte for {period}",
+                    amount=amount,
+                    account1=acc1,
+                    account2=acc2,
+                    template_name=const.UDEN_MOMS,
                 )
-        ctx.render_transactions(period, "udbytte", udbytte_output)
-
-        loen_output = []
-        loen_csv = ctx.get_loen_csv(period)
-        for row in loen_csv:
-            date_posted = row[const.DATE_POSTED]
-            date_posted = datetime(
-                int(period), int(date_posted[:2]), int(date_posted[2:])
             )
+    files.append(ctx.render_transactions(period, "udbytte", udbytte_output))
 
-            period_txt = row[const.PERIOD_TXT]
-            udbetaling = util.parse_amount(row[const.TIL_UDBETALING], const.DOT)
-            atp = util.parse_amount(row[const.LOEN_ATP], const.DOT)
-            skat = util.parse_amount(row[const.A_SKAT], const.DOT)
-            am_bidrag_mv = util.parse_amount(row[const.AM_BIDRAG_MV], const.DOT)
-            gebyr = util.parse_amount(row[const.LOEN_GEBYR], const.DOT)
-
-            for account, amount in (
-                (const.LOEN_ATP, atp),
-                (const.LOEN_ANSAT, udbetaling),
-                (const.LOEN_GEBYR, gebyr),
-                (const.LOEN_SKAT, skat + am_bidrag_mv),
-            ):
-                loen_output.append(
-                    Transaction(
-                        account2="Expenses:Loen:%s" % (account,),
-                        account1="Liabilities:Loen:Skyldig%s" % (account,),
-                        amount=amount,
-                        date_posted=date_posted,
-                        text="Løn",
-                        extra_text=f"Løn {account}. Periode {period_txt}",
-                        template_name=const.UDEN_MOMS,
-                    )
-                )
-        ctx.render_transactions(period, "loen", loen_output)
+    loen_output = []
+    loen_csv = ctx.get_loen_csv(period)
+    for row in loen_csv:
+        date_posted = row[const.DATE_POSTED]
+        date_posted = datetime(int(period), int(date_posted[:2]), int(date_posted[2:]))
 
-        for all_transactions in (
-            transactions,
-            loen_output,
-            salg_output,
-            udbytte_output,
+        period_txt = row[const.PERIOD_TXT]
+        udbetaling = util.parse_amount(row[const.TIL_UDBETALING], const.DOT)
+        atp = util.parse_amount(row[const.LOEN_ATP], const.DOT)
+        skat = util.parse_amount(row[const.A_SKAT], const.DOT)
+        am_bidrag_mv = util.parse_amount(row[const.AM_BIDRAG_MV], const.DOT)
+        gebyr = util.parse_amount(row[const.LOEN_GEBYR], const.DOT)
+
+        for account, amount in (
+            (const.LOEN_ATP, atp),
+            (const.LOEN_ANSAT, udbetaling),
+            (const.LOEN_GEBYR, gebyr),
+            (const.LOEN_SKAT, skat + am_bidrag_mv),
         ):
-            for t in all_transactions:
-                kontoplan_accounts += t.all_accounts
-        kontoplan_accounts += [
-            "Equity:Afrunding",
-            "Liabilities:Moms:SkyldigMoms",
-            "Liabilities:Moms:SalgMoms",
-            "Assets:Moms:KoebMoms",
-            "Equity:Opening-Balances",
-            "Equity:MomsKorrektion",
-        ]
+            loen_output.append(
+                Transaction(
+                    account2="Expenses:Loen:%s" % (account,),
+                    account1="Liabilities:Loen:Skyldig%s" % (account,),
+                    amount=amount,
+                    date_posted=date_posted,
+                    text="Løn",
+                    extra_text=f"Løn {account}. Periode {period_txt}",
+                    template_name=const.UDEN_MOMS,
+                )
+            )
+    files.append(ctx.render_transactions(period, "loen", loen_output))
 
-    # opdater kontoplan fil
-    ctx.write_company_kontoplan_file(
-        ["1900-01-01 open %s DKK" % (x,) for x in sorted(set(kontoplan_accounts))],
-    )
+    kontoplan_accounts = []
+    for all_transactions in (
+        transactions,
+        loen_output,
+        salg_output,
+        udbytte_output,
+    ):
+        for t in all_transactions:
+            kontoplan_accounts += t.all_accounts
+    kontoplan_accounts += [
+        "Equity:Afrunding",
+        "Liabilities:Moms:SkyldigMoms",
+        "Liabilities:Moms:SalgMoms",
+        "Assets:Moms:KoebMoms",
+        "Equity:Opening-Balances",
+        "Equity:MomsKorrektion",
+    ]
+
+    return files, kontoplan_accounts, errors, ctx.changed_files[changed_before:]
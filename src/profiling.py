@@ -0,0 +1,201 @@
+import os
+import sys
+import time
+from os import path
+
+# slaas til med --profile eller LEDGER_PROFILE=1; LEDGER_PROFILE_DUMP=mappe
+# gemmer desuden cProfile- og tracemalloc-output
+ENV_PROFILE = "LEDGER_PROFILE"
+ENV_PROFILE_DUMP = "LEDGER_PROFILE_DUMP"
+
+_enabled = False
+_dump_dir = None
+_profiler = None
+# navn -> Stage, i den raekkefoelge trinene foerst koeres
+_stages = {}
+# trin der koerer lige nu, inderste sidst
+_active = []
+
+
+class Stage:
+    """Samlet tid, antal kald, raekker og allokeringer for et trin.
+
+    Tid og allokeringer er trinets egne: det der bruges i et trin inde i
+    trinet (fx render inde i skrivningen af en fil) tælles kun dér.
+    """
+
+    __slots__ = (
+        "name",
+        "calls",
+        "seconds",
+        "rows",
+        "blocks",
+        "_start",
+        "_blocks",
+        "_inner_seconds",
+        "_inner_blocks",
+    )
+
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.seconds = 0.0
+        self.rows = 0
+        self.blocks = 0
+
+    def add(self, rows):
+        self.rows += rows
+
+    def __enter__(self):
+        self._inner_seconds = 0.0
+        self._inner_blocks = 0
+        _active.append(self)
+        self._blocks = sys.getallocatedblocks()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self._start
+        blocks = sys.getallocatedblocks() - self._blocks
+        _active.pop()
+        if _active:
+            _active[-1]._inner_seconds += seconds
+            _active[-1]._inner_blocks += blocks
+        self.seconds += seconds - self._inner_seconds
+        self.blocks += blocks - self._inner_blocks
+        self.calls += 1
+
+
+class _NullStage:
+    """Bruges naar profilering er slaaet fra, saa et trin kun koster et kald."""
+
+    __slots__ = ()
+
+    def add(self, rows):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(name):
+    """Context manager der tager tid paa trinet name; .add(n) taeller raekker."""
+    if not _enabled:
+        return _NULL_STAGE
+    if name not in _stages:
+        _stages[name] = Stage(name)
+    return _stages[name]
+
+
+def iterate(name, iterable):
+    """Som iterable, men tiden det tager at danne hvert element tælles på name.
+
+    Bruges til generatorer der forbruges løbende, fx posteringer der
+    renderes mens de skrives, hvor et with-trin ville tælle begge dele.
+    Der tælles kun tid og elementer; sys.getallocatedblocks er for dyr at
+    kalde for hvert element.
+    """
+    if not _enabled:
+        return iterable
+    return _iterate(stage(name), iterable)
+
+
+_END = object()
+
+
+def _iterate(st, iterable):
+    iterator = iter(iterable)
+    st.calls += 1
+    while True:
+        start = time.perf_counter()
+        item = next(iterator, _END)
+        seconds = time.perf_counter() - start
+        st.seconds += seconds
+        if _active:
+            _active[-1]._inner_seconds += seconds
+        if item is _END:
+            return
+        st.rows += 1
+        yield item
+
+
+def is_enabled():
+    return _enabled
+
+
+def take():
+    """Trinene målt indtil nu som tupler, som nulstilles.
+
+    Bruges i worker-processer, som sender målingerne tilbage med deres
+    resultat, så merge kan lægge dem til hovedprocessens trin.
+    """
+    result = [(s.name, s.seconds, s.calls, s.rows, s.blocks) for s in _stages.values()]
+    _stages.clear()
+    return result
+
+
+def merge(stages):
+    for name, seconds, calls, rows, blocks in stages:
+        s = stage(name)
+        s.seconds += seconds
+        s.calls += calls
+        s.rows += rows
+        s.blocks += blocks
+
+
+def enable(dump_dir=None):
+    """Slaar timere til; med dump_dir koeres ogsaa cProfile og tracemalloc."""
+    global _enabled, _dump_dir, _profiler
+    _enabled = True
+    _dump_dir = dump_dir
+    # en worker-proces kan have arvet hovedprocessens trin ved fork
+    _stages.clear()
+    if dump_dir:
+        import cProfile
+        import tracemalloc
+
+        os.makedirs(dump_dir, exist_ok=True)
+        tracemalloc.start()
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+
+
+def enable_from_env(profile=False):
+    if profile or os.environ.get(ENV_PROFILE, "") not in ("", "0"):
+        enable(os.environ.get(ENV_PROFILE_DUMP) or None)
+
+
+def report(file=None):
+    """Udskriver trinene og gemmer cProfile/tracemalloc output hvis det er slaaet til."""
+    if not _enabled:
+        return
+    file = file or sys.stdout
+    if _profiler:
+        _profiler.disable()
+    # med opdater --jobs er tiden summen over alle processer
+    print("Profil (egen tid, kald, rækker, netto allokerede blokke):", file=file)
+    for s in _stages.values():
+        print(
+            f"  {s.name:<28} {s.seconds:9.3f}s {s.calls:6d} {s.rows:10d} {s.blocks:10d}",
+            file=file,
+        )
+    if not _dump_dir:
+        return
+
+    import tracemalloc
+
+    prof_filename = path.join(_dump_dir, "ledger.prof")
+    _profiler.dump_stats(prof_filename)
+    snapshot = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    tracemalloc_filename = path.join(_dump_dir, "tracemalloc.txt")
+    with open(tracemalloc_filename, "w", encoding="utf-8") as f:
+        for statistic in snapshot.statistics("lineno")[:50]:
+            f.write(f"{statistic}\n")
+    print(f"cProfile: {prof_filename}, tracemalloc: {tracemalloc_filename}", file=file)
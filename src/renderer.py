@@ -0,0 +1,78 @@
+import os
+import re
+from os import path
+
+# {{ navn }}, {{ navn.ljust(50) }} og {{ navn.rjust(20) }}
+EXPRESSION = re.compile(r"\{\{\s*(.*?)\s*\}\}")
+SIMPLE_EXPRESSION = re.compile(r"^([A-Za-z_]\w*)(?:\.(ljust|rjust)\((\d+)\))?$")
+
+
+class CompiledTemplate:
+    """Skabelon oversat til en Python funktion der giver samme output som Jinja2.
+
+    Understøtter kun variable og ljust/rjust på variable, hvilket er hvad
+    posteringsskabelonerne bruger. compile() returnerer None for skabeloner
+    med andre Jinja2 konstruktioner.
+    """
+
+    def __init__(self, name, source, render):
+        self.name = name
+        self.source = source
+        self._render = render
+
+    def render(self, context):
+        return self._render(context)
+
+    @staticmethod
+    def compile(name, source):
+        if "{%" in source or "{#" in source or "\r" in source:
+            return None
+        if "{{" in EXPRESSION.sub("", source):
+            return None
+        # Jinja2 fjerner som standard et enkelt afsluttende linjeskift
+        if source.endswith("\n"):
+            source = source[:-1]
+
+        parts = []
+        pos = 0
+        for match in EXPRESSION.finditer(source):
+            expression = SIMPLE_EXPRESSION.match(match.group(1))
+            if not expression:
+                return None
+            parts.append(repr(source[pos : match.start()]))
+            key, method, width = expression.groups()
+            if method:
+                parts.append(f"context[{key!r}].{method}({width})")
+            else:
+                parts.append(f"str(context.get({key!r}, ''))")
+            pos = match.end()
+        parts.append(repr(source[pos:]))
+
+        code = "lambda context: ''.join((%s,))" % (", ".join(parts),)
+        return CompiledTemplate(
+            name, source, eval(code, {"__builtins__": {"str": str}})
+        )
+
+
+def load_templates(templates_path):
+    """Indlæser posteringsskabelonerne (*.txt) i templates_path, nøglet på
+    filnavn uden endelse.
+
+    Skabeloner der kan oversættes bliver CompiledTemplate, resten Jinja2.
+    """
+    templates = {}
+    jinja_env = None
+    for fn in os.listdir(templates_path):
+        # fakturaskabelonerne (html/css) bruges af invoice
+        if not fn.endswith(".txt"):
+            continue
+        with open(path.join(templates_path, fn), encoding="utf-8") as f:
+            template = CompiledTemplate.compile(fn, f.read())
+        if template is None:
+            if jinja_env is None:
+                from jinja2 import Environment, FileSystemLoader
+
+                jinja_env = Environment(loader=FileSystemLoader(templates_path))
+            template = jinja_env.get_template(fn)
+        templates[fn.split(".")[0]] = template
+    return templates
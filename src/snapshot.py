@@ -0,0 +1,125 @@
+import hashlib
+import os
+import tempfile
+import zlib
+from datetime import date, datetime
+from os import path
+import constants as const
+import util
+
+
+def diff_manifests(old, new):
+    """(tilføjede, fjernede, ændrede) filer mellem to godkendelser.
+
+    Sammenligner kun hashes i manifesterne, så tiden afhænger af antallet
+    af filer og ikke af deres størrelse.
+    """
+    old_files = old and old["files"] or {}
+    new_files = new["files"]
+    added = sorted(fn for fn in new_files if fn not in old_files)
+    removed = sorted(fn for fn in old_files if fn not in new_files)
+    changed = sorted(
+        fn
+        for fn in new_files
+        if fn in old_files and new_files[fn][0] != old_files[fn][0]
+    )
+    return added, removed, changed
+
+
+class SnapshotStore:
+    """Indholdsadresseret lager af godkendte firmafiler.
+
+    Hver godkendelse gemmes som et manifest med (hash, størrelse, mtime) pr.
+    fil, og filernes indhold som zlib-komprimerede blobs navngivet efter
+    deres sha256. En fil der ikke er ændret siden sidste godkendelse hverken
+    læses eller gemmes igen.
+    """
+
+    def __init__(self, company_path):
+        self.company_path = company_path
+        self.path = path.join(company_path, const.SNAPSHOT_DIR)
+
+    @property
+    def latest_path(self):
+        return path.join(self.path, "latest.json")
+
+    def blob_path(self, digest):
+        return path.join(self.path, "objects", digest[:2], digest[2:])
+
+    def latest(self):
+        """Manifestet for seneste godkendelse, eller None."""
+        return util.load_json(self.latest_path)
+
+    def last_approved(self) -> date | None:
+        latest = self.latest()
+        if not latest:
+            return None
+        return datetime.strptime(latest["enddate"], "%Y-%m-%d").date()
+
+    def company_files(self):
+        """Firmaets filer relativt til firmamappen; skjulte filer og mapper udelades."""
+        for dirpath, dirnames, filenames in os.walk(self.company_path):
+            dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+            for filename in sorted(filenames):
+                if not filename.startswith("."):
+                    yield path.relpath(path.join(dirpath, filename), self.company_path)
+
+    def read_blob(self, digest):
+        with open(self.blob_path(digest), "rb") as f:
+            return zlib.decompress(f.read())
+
+    def write_blob(self, digest, content):
+        """Gemmer content under digest; returnerer False hvis blob'en findes."""
+        filename = self.blob_path(digest)
+        if path.exists(filename):
+            return False
+        os.makedirs(path.dirname(filename), exist_ok=True)
+        fd, tmp_filename = tempfile.mkstemp(dir=path.dirname(filename), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(content))
+            os.replace(tmp_filename, filename)
+        except BaseException:
+            os.remove(tmp_filename)
+            raise
+        return True
+
+    def snapshot(self, enddate):
+        """Gemmer en godkendelse af firmaets filer pr. enddate.
+
+        Returnerer (manifest, antal nye blobs). Filer med samme størrelse og
+        mtime som i seneste godkendelse genbruger dens hash uden at blive læst.
+        """
+        previous = (self.latest() or {}).get("files", {})
+        files = {}
+        new_blobs = 0
+        for filename in self.company_files():
+            stat = os.stat(path.join(self.company_path, filename))
+            cached = previous.get(filename)
+            if cached and cached[1:] == [stat.st_size, stat.st_mtime_ns]:
+                files[filename] = cached
+                continue
+            with open(path.join(self.company_path, filename), "rb") as f:
+                content = f.read()
+            digest = hashlib.sha256(content).hexdigest()
+            new_blobs += self.write_blob(digest, content)
+            files[filename] = [digest, stat.st_size, stat.st_mtime_ns]
+
+        os.makedirs(path.join(self.path, "snapshots"), exist_ok=True)
+        approved_at = datetime.now()
+        manifest = {
+            "enddate": util.format_date(enddate),
+            "approved_at": approved_at.isoformat(timespec="seconds"),
+            "files": files,
+        }
+        util.write_json(
+            path.join(
+                self.path,
+                "snapshots",
+                "%s_%s.json"
+                % (util.format_date(enddate), approved_at.strftime("%Y%m%dT%H%M%S")),
+            ),
+            manifest,
+        )
+        util.write_json(self.latest_path, manifest)
+        return manifest, new_blobs
@@ -1,6 +1,55 @@
+from datetime import date, timedelta
+from aggregates import AggregateTable
+from bank_index import BankLineIndex
+import util
+
+# hovedgrupperne i bevaegelsesoversigten
+ACCOUNT_TYPES = ("Assets", "Liabilities", "Equity", "Income", "Expenses")
+
+
 def handle_status(ctx):
-    print(
-        f"Status for {ctx.company_name} (periode {ctx.period}, enddate {ctx.enddate})"
-    )
-    # TODO: Implement blueprint logic for status
-    print("Logic not yet implemented according to blueprint.")
+    """Rapporterne fra queries/queries.beancount, læst fra aggregat-tabellen."""
+    print(f"Status for {ctx.company_name} (enddate {ctx.enddate})")
+    table = AggregateTable.load(ctx)
+
+    # vinduet er fra seneste godkendelse, ellers fra starten af aaret
+    if ctx.last_approved:
+        print("Sidst godkendt:", util.format_date(ctx.last_approved))
+        approved_index = BankLineIndex.approved(ctx)
+        if approved_index:
+            new_lines = BankLineIndex.load(ctx).new_since(approved_index)
+            print("Nye banklinjer siden godkendelsen:", len(new_lines))
+        start_month = (ctx.last_approved + timedelta(days=1)).strftime("%Y-%m")
+    else:
+        start_month = f"{ctx.enddate.year}-01"
+    end_month = ctx.enddate.strftime("%Y-%m")
+    # bevaegelser, moms og koersel summeres over vinduet
+    window = start_month <= end_month and f"{start_month} - {end_month}"
+    if not window:
+        print("Ingen bevægelser siden seneste godkendelse")
+    else:
+        print(f"Bevægelser {window}:")
+        for account_type in ACCOUNT_TYPES:
+            total = sum(table.sum(f"^{account_type}:", start_month, end_month).values())
+            print(f"  {account_type:<12} {util.format_money(total):>15}")
+
+        print(f"Moms-oversigt {window}:")
+        for account, total in table.sum("Moms", start_month, end_month).items():
+            print(f"  {account:<50} {util.format_money(total):>15}")
+
+    # aabne poster: alle forfaldne fakturaer, ogsaa fra foer vinduet
+    print("Forfaldne fakturaer (alle perioder):")
+    balance = 0
+    for d, due_date, text, account, amount in table.due(
+        "Debitorer", util.format_date(date.today())
+    ):
+        balance += amount
+        print(
+            f"  {d} {text} (forfald {due_date})",
+            util.format_money(amount),
+            util.format_money(balance),
+        )
+
+    if window:
+        koersel = sum(table.sum("Mileage", start_month, end_month).values())
+        print(f"Kørsel {window}:", util.format_money(koersel))
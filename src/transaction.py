@@ -1,12 +1,13 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from datetime import datetime, date
-from functools import cached_property
 import constants as const
 import util
 from decimal import Decimal
 
 
-@dataclass
+# slots=True: ingen __dict__ pr. instans, da der dannes mange transaktioner.
+# Afledte vaerdier er derfor properties i stedet for cached_property.
+@dataclass(slots=True)
 class Transaction:
     date_posted: date
     text: str
@@ -15,6 +16,11 @@ class Transaction:
     account1: str
     account2: str
     template_name: str
+    amount_abs: Decimal = field(init=False, repr=False)
+    amount_vat_liable: Decimal = field(init=False, repr=False)
+    amount_vat_non_liable: Decimal = field(init=False, repr=False)
+    vat_pct: Decimal = field(init=False, repr=False)
+    account3: str = field(init=False, repr=False)
 
     def __post_init__(self):
         if isinstance(self.date_posted, datetime):
@@ -32,15 +38,15 @@ class Transaction:
         self.amount_vat_liable = amount_vat_liable_including_vat / (1 + vat_pct)
         self.vat_pct = vat_pct
 
-    @cached_property
+    @property
     def amount_wo_vat(self):
         return self.amount_vat_non_liable + self.amount_vat_liable
 
-    @cached_property
+    @property
     def vat(self):
         return self.amount_wo_vat * self.vat_pct
 
-    @cached_property
+    @property
     def all_accounts(self):
         return [
             a.strip()
@@ -48,7 +54,7 @@ class Transaction:
             if isinstance(a, str) and a.strip()
         ]
 
-    @cached_property
+    @property
     def as_dict(self):
         sign = 1 if self.amount > 0 else -1
         return {
@@ -80,40 +86,108 @@ class Transaction:
             # "vat_pct": self.vat_pct,
         }
 
-    @cached_property
+    @property
     def is_vat(self):
         return "moms" in self.transaction_type[const.TEMPLATE_NAME]
 
     @staticmethod
-    def from_salg_csv(rows, ctx):
+    def from_salg_csv(rows, ctx, errors=None):
+        """Danner salgstransaktioner; manglende priser samles i errors.
+
+        Uden errors rejses en ValueError med alle manglende priser.
+        """
         result = []
-        for row in rows:
-            account_name = row[const.ACCOUNT_NAME]
-            yymmdd = datetime.strptime(row[const.YYMMDD], "%y%m%d")
-            yymmdd_text = row[const.PERIOD_TXT]
-            hours = Decimal(row[const.HOURS])
-            support_hours = Decimal(row[const.SUPPORT_HOURS])
-
-            hour_price = ctx.find_price(account_name, "Timepris", yymmdd)
-            support_price = ctx.find_price(account_name, "Support", yymmdd)
-            amount_wo_vat = hours * hour_price + support_hours * support_price
-            price_text = f"Timer: {hours} * {hour_price} = {hours * hour_price}"
-            if support_hours > 0:
-                price_text += f". Support: {support_hours} * {support_price} = {support_hours * support_price}"
+        missing = []
+        for line in salg_lines(rows, ctx, missing):
+            price_text = (
+                f"Timer: {line.hours} * {line.hour_price} = {line.hours_amount}"
+            )
+            if line.has_support:
+                price_text += f". Support: {line.support_hours} * {line.support_price} = {line.support_amount}"
 
             transaction = Transaction(
-                date_posted=yymmdd,
+                date_posted=line.date_posted,
                 text="Salg",
-                extra_text=f"Salg {account_name}. Periode {yymmdd_text}. {price_text}",
-                amount=amount_wo_vat * (1 + const.VAT_PCT),
-                account1=f"Income:Salg:{account_name}",
-                account2=f"Assets:Debitorer:{account_name}",
+                extra_text=f"Salg {line.account_name}. Periode {line.period_txt}. {price_text}",
+                amount=line.amount_wo_vat * (1 + const.VAT_PCT),
+                account1=f"Income:Salg:{line.account_name}",
+                account2=f"Assets:Debitorer:{line.account_name}",
                 template_name=const.MED_MOMS,
             )
             transaction.set_vat("Liabilities:Moms:SalgMoms", const.VAT_PCT, 0)
             result.append(transaction)
+        if missing and errors is None:
+            raise ValueError("Manglende priser:\n%s" % ("\n".join(missing),))
+        if errors is not None:
+            errors += missing
         return result
 
-    @cached_property
+    @property
     def company_path(self) -> str:
         return ""
+
+
+@dataclass(slots=True, frozen=True)
+class SalgLine:
+    """En række i salg.txt med timepris og supportpris slået op.
+
+    Deles af salgstransaktionerne og fakturaerne, så de altid giver samme beløb.
+    """
+
+    account_name: str
+    yymmdd: str
+    date_posted: datetime
+    period_txt: str
+    hours: Decimal
+    hour_price: Decimal
+    support_hours: Decimal
+    support_price: Decimal
+
+    @property
+    def hours_amount(self):
+        return self.hours * self.hour_price
+
+    @property
+    def support_amount(self):
+        return self.support_hours * self.support_price
+
+    @property
+    def has_support(self):
+        return self.support_hours > 0
+
+    @property
+    def amount_wo_vat(self):
+        return self.hours_amount + self.support_amount
+
+
+def salg_lines(rows, ctx, missing):
+    """SalgLine for hver række i salg.txt.
+
+    Rækker uden timepris eller supportpris springes over; de manglende
+    priser tilføjes missing.
+    """
+    for row in rows:
+        account_name = row[const.ACCOUNT_NAME]
+        date_posted = datetime.strptime(row[const.YYMMDD], "%y%m%d")
+        hour_price = ctx.find_price(account_name, "Timepris", date_posted)
+        support_price = ctx.find_price(account_name, "Support", date_posted)
+        if hour_price is None or support_price is None:
+            missing += [
+                "Ingen %s for %s pr. %s" % (price_type, account_name, row[const.YYMMDD])
+                for price_type, price in (
+                    ("Timepris", hour_price),
+                    ("Support", support_price),
+                )
+                if price is None
+            ]
+            continue
+        yield SalgLine(
+            account_name=account_name,
+            yymmdd=row[const.YYMMDD],
+            date_posted=date_posted,
+            period_txt=row[const.PERIOD_TXT],
+            hours=Decimal(row[const.HOURS]),
+            hour_price=hour_price,
+            support_hours=Decimal(row[const.SUPPORT_HOURS]),
+            support_price=support_price,
+        )
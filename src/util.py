@@ -1,7 +1,11 @@
-import pandas as pd
-from datetime import datetime
+import csv
+import glob
+import hashlib
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta
 import constants as const
-from dateutil.relativedelta import relativedelta
 from decimal import Decimal, ROUND_HALF_UP
 
 
@@ -10,6 +14,8 @@ def afrund_decimal(dec):
 
 
 def add_months(dt, months):
+    from dateutil.relativedelta import relativedelta
+
     return dt + relativedelta(months=months)
 
 
@@ -18,7 +24,7 @@ def first_day_of_month(dt):
 
 
 def last_day_of_month(dt):
-    return first_day_of_month(add_months(dt, 1)) - relativedelta(days=1)
+    return first_day_of_month(add_months(dt, 1)) - timedelta(days=1)
 
 
 def format_money(num):
@@ -84,15 +90,54 @@ def parse_amount(amount, decimal_separator_in_input):
 bank_date_parser = date_parser("%d-%m-%Y")
 
 
+def parse_bank_dates(values):
+    """Parser en kolonne af bankdatoer; hver forskellig dato parses kun én gang."""
+    parsed = {}
+    result = []
+    for value in values:
+        if value not in parsed:
+            parsed[value] = bank_date_parser(value)
+        result.append(parsed[value])
+    return result
+
+
+def parse_amounts(values, decimal_separator_in_input):
+    """Parser en kolonne af beløb; giver præcis samme Decimal som parse_amount.
+
+    Kolonnen samles i én streng, så separatorerne erstattes med to replace
+    over hele kolonnen i stedet for pr. værdi. Antal decimaler og fortegn
+    (fx "-0,00") bevares som i inputtet.
+    """
+    if not values:
+        return []
+    thousands_separator = (
+        decimal_separator_in_input == const.COMMA and const.DOT or const.COMMA
+    )
+    column = (
+        "\n".join(values)
+        .replace(thousands_separator, "")
+        .replace(decimal_separator_in_input, const.DOT)
+    )
+    return list(map(Decimal, column.split("\n")))
+
+
 def load_csv(filename, spec, sep=const.SEMICOLON):
-    dicts = pd.read_csv(
-        filename,
-        names=spec.keys(),
-        sep=sep,
-        encoding="utf-8",
-        dtype=spec,
-    ).to_dict(orient="records")
-    return dicts
+    """Læser en CSV-fil uden header som dicts efter spec, én række ad gangen.
+
+    Kolonnerne navngives og konverteres med typerne i spec (fra
+    const.CSV_SPECS). Tomme felter og manglende kolonner bliver None, og
+    tomme linjer springes over. Et evt. UTF-8 BOM fjernes som i pandas.
+    """
+    columns = list(spec.items())
+    with open(filename, newline="", encoding="utf-8-sig") as f:
+        for fields in csv.reader(f, delimiter=sep):
+            if not fields:
+                continue
+            fields += [""] * (len(columns) - len(fields))
+            yield dict(
+                (name, converter(value) if value != "" else None)
+                for (name, converter), value in zip(columns, fields)
+            )
 
 
 def csv_to_list(filename, spec, transformer=None):
@@ -100,21 +145,118 @@ def csv_to_list(filename, spec, transformer=None):
 
 
 def csv_to_dict(filename, spec, transformer):
-    tmp = load_csv(filename, spec)
-    return dict([transformer(x) for x in tmp])
+    return dict(transformer(x) for x in load_csv(filename, spec))
 
 
 def write_file(filename, content, encoding="utf-8"):
-    _write_file(filename, content, encoding=encoding)
+    if isinstance(content, list):
+        content = join_chunks("\n", content)
+    elif isinstance(content, str):
+        content = [content]
+    return write_chunks(filename, content, encoding=encoding)
 
 
 def append_file(filename, content, encoding="utf-8"):
-    _write_file(filename, content, encoding=encoding, mode="a")
-
-
-def _write_file(filename, content, encoding="utf-8", mode="w"):
-    with open(filename, mode, encoding=encoding) as f:
+    with open(filename, "a", encoding=encoding) as f:
         if isinstance(content, list):
             f.write("\n".join(content))
         else:
             f.write(content)
+
+
+def join_chunks(separator, chunks):
+    """Som separator.join(chunks), men som generator."""
+    first = True
+    for chunk in chunks:
+        if not first:
+            yield separator
+        first = False
+        yield chunk
+
+
+def write_chunks(filename, chunks, encoding="utf-8"):
+    """Skriver chunks gennem en bufferet midlertidig fil, som omdøbes til filename.
+
+    En afbrudt kørsel efterlader derfor aldrig en halvt skrevet fil. Har
+    filename allerede samme indhold, røres den ikke (mtime bevares).
+    Returnerer True hvis filen blev ændret.
+    """
+    dirname, basename = os.path.split(filename)
+    fd, tmp_filename = tempfile.mkstemp(
+        dir=dirname or ".", prefix=f".{basename}.", suffix=".tmp"
+    )
+    try:
+        with os.fdopen(fd, "w", encoding=encoding, buffering=1 << 16) as f:
+            for chunk in chunks:
+                f.write(chunk)
+        if files_equal(tmp_filename, filename):
+            os.remove(tmp_filename)
+            return False
+        # mkstemp opretter filen med 0600; brug samme rettigheder som open()
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_filename, 0o666 & ~umask)
+        os.replace(tmp_filename, filename)
+    except BaseException:
+        os.remove(tmp_filename)
+        raise
+    return True
+
+
+def move_if_changed(src, dst):
+    """Flytter src til dst, medmindre dst har samme indhold (så bevares dens mtime).
+
+    Returnerer True hvis dst blev ændret.
+    """
+    if files_equal(src, dst):
+        os.remove(src)
+        return False
+    os.replace(src, dst)
+    return True
+
+
+def files_equal(filename1, filename2):
+    if not os.path.exists(filename2):
+        return False
+    if os.path.getsize(filename1) != os.path.getsize(filename2):
+        return False
+    return file_hash(filename1) == file_hash(filename2)
+
+
+def file_hash(filename):
+    """sha256 af filens indhold, eller None hvis filen ikke findes."""
+    if not os.path.exists(filename):
+        return None
+    with open(filename, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def include_tree_hash(filenames, salt=""):
+    """Beregner en indholds-hash af alle inkluderede filer.
+
+    Ud over filernes indhold hashes listen af .beancount filer i de mapper
+    filerne ligger i, så en ny fil der matcher et include-glob også
+    invaliderer cachen. salt hashes først, fx versionen af det der læser filerne.
+    """
+    sha = hashlib.sha256(salt.encode("utf-8"))
+    for filename in sorted(set(filenames)):
+        sha.update(filename.encode("utf-8"))
+        if not os.path.exists(filename):
+            continue
+        with open(filename, "rb") as f:
+            sha.update(hashlib.sha256(f.read()).digest())
+    for dirname in sorted(set(os.path.dirname(f) for f in filenames)):
+        for filename in sorted(glob.glob(os.path.join(dirname, "*.beancount"))):
+            sha.update(filename.encode("utf-8"))
+    return sha.hexdigest()
+
+
+def load_json(filename, default=None):
+    if not os.path.exists(filename):
+        return default
+    with open(filename, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(filename, content):
+    return write_file(filename, json.dumps(content, indent=2, sort_keys=True))
@@ -0,0 +1,117 @@
+import os
+import time
+from os import path
+import constants as const
+from opdater import handle_opdater
+
+
+def snapshot(directories, filenames=()):
+    """(mtime, stoerrelse) for filerne i directories og for filenames."""
+    result = {}
+    for directory in directories:
+        try:
+            entries = list(os.scandir(directory))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            if entry.is_file() and not entry.name.startswith("."):
+                stat = entry.stat()
+                result[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    for filename in filenames:
+        if path.exists(filename):
+            stat = os.stat(filename)
+            result[filename] = (stat.st_mtime_ns, stat.st_size)
+    return result
+
+
+def changed_paths(before, after):
+    return sorted(
+        filename
+        for filename in before.keys() | after.keys()
+        if before.get(filename) != after.get(filename)
+    )
+
+
+def watched_directories(ctx):
+    """Periode- og stamdatamapper samt skabeloner for firmaet."""
+    return [
+        path.join(ctx.company_path, const.STAMDATA_DIR),
+        ctx.templates_path,
+    ] + [path.join(ctx.company_path, period) for period in ctx.periods]
+
+
+def list_periods(ctx):
+    return sorted(d for d in os.listdir(ctx.company_path) if d.startswith("20"))
+
+
+def warm_up(ctx):
+    """Indlaeser skabeloner, konti, matcher, priser og transaktionstyper."""
+    ctx.templates
+    ctx.all_accounts
+    ctx.account_matcher
+    ctx.prices
+    ctx.transaction_types
+    ctx.resolved_accounts
+
+
+def handle_watch(ctx, interval=1.0, debounce=0.5):
+    """Holder konteksten varm og koerer opdater naar input aendres.
+
+    Mapperne polles hvert interval sekund; en aendring behandles foerst
+    naar filerne har vaeret uaendrede i debounce sekunder, saa en
+    bankeksport der skrives i flere omgange kun giver en opdatering.
+    Kun perioder hvis input er aendret dannes igen (via manifestet).
+    """
+    warm_up(ctx)
+    handle_opdater(ctx)
+    period_dirs = list_periods(ctx)
+    state = snapshot(watched_directories(ctx), [const.TRANSACTION_TYPE_CSV])
+    print(f"Overvåger {ctx.company_name} (Ctrl-C for at stoppe)")
+
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot(watched_directories(ctx), [const.TRANSACTION_TYPE_CSV])
+            new_period_dirs = list_periods(ctx)
+            if current == state and new_period_dirs == period_dirs:
+                continue
+
+            # vent til filerne er faerdigskrevne
+            detected = time.perf_counter()
+            while True:
+                time.sleep(debounce)
+                settled = snapshot(
+                    watched_directories(ctx), [const.TRANSACTION_TYPE_CSV]
+                )
+                if settled == current:
+                    break
+                current = settled
+
+            changes = changed_paths(state, current)
+            start = time.perf_counter()
+            # stamdata og skabeloner indlaeses igen; perioderne afgoeres af manifestet
+            period_paths = set(
+                path.join(ctx.company_path, period) for period in ctx.periods
+            )
+            shared = [fn for fn in changes if path.dirname(fn) not in period_paths]
+            if shared or new_period_dirs != period_dirs:
+                ctx.reload_inputs()
+            ctx.changed_files.clear()
+            try:
+                warm_up(ctx)
+                handle_opdater(ctx)
+            except Exception as e:
+                print(f"Fejl: {e}")
+            state = snapshot(watched_directories(ctx), [const.TRANSACTION_TYPE_CSV])
+            period_dirs = new_period_dirs
+            end = time.perf_counter()
+            print(
+                "Ændret: %s; opdateret på %.2fs (%.2fs efter ændringen)"
+                % (
+                    [path.relpath(fn, ctx.company_path) for fn in changes],
+                    end - start,
+                    end - detected,
+                )
+            )
+    except KeyboardInterrupt:
+        pass
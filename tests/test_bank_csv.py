@@ -0,0 +1,106 @@
+"""Kolonnevis parsning af bank.csv mod den rækkevise reference.
+
+python -m unittest discover tests
+"""
+
+import os
+import random
+import sys
+import unittest
+from datetime import date, timedelta
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_PATH, "src"))
+
+import constants as const  # noqa: E402
+import util  # noqa: E402
+from bank_transaction import BankTransaction  # noqa: E402
+
+EDGE_CASES = [
+    "-0,00",
+    "0,00",
+    "12",
+    "-12",
+    "12,5",
+    "0,01",
+    "-0,01",
+    "1.234,56",
+    "-1.234,56",
+    "1.234.567,89",
+    "1.000",
+    ",5",
+    "+3,10",
+    "0,123",
+]
+
+
+def random_amount(rnd):
+    whole = f"{rnd.randint(0, 10 ** rnd.randint(0, 9)):,}".replace(",", ".")
+    decimals = rnd.choice(["", ",", ",0", ",00", ",%02d" % rnd.randint(0, 99)])
+    return rnd.choice(["", "-"]) + whole + decimals
+
+
+class ParseTest(unittest.TestCase):
+    def assertSameDecimals(self, values, separator):
+        expected = [util.parse_amount(value, separator) for value in values]
+        actual = util.parse_amounts(values, separator)
+        # samme værdi og samme repræsentation (eksponent og fortegn)
+        self.assertEqual([str(d) for d in actual], [str(d) for d in expected])
+
+    def test_parse_amounts_edge_cases(self):
+        self.assertSameDecimals(EDGE_CASES, const.COMMA)
+        self.assertSameDecimals(
+            [v.translate(str.maketrans(",.", ".,")) for v in EDGE_CASES], const.DOT
+        )
+        self.assertEqual(util.parse_amounts([], const.COMMA), [])
+
+    def test_parse_amounts_random(self):
+        rnd = random.Random(42)
+        for _ in range(20):
+            values = [random_amount(rnd) for _ in range(rnd.randint(1, 500))]
+            self.assertSameDecimals(values, const.COMMA)
+
+    def test_parse_bank_dates(self):
+        rnd = random.Random(42)
+        values = [
+            (date(2024, 1, 1) + timedelta(days=rnd.randint(0, 730))).strftime(
+                "%d-%m-%Y"
+            )
+            for _ in range(1000)
+        ]
+        self.assertEqual(
+            util.parse_bank_dates(values), [util.bank_date_parser(v) for v in values]
+        )
+
+    def test_from_bank_csv_matches_rowwise(self):
+        rnd = random.Random(42)
+        rows = [
+            {
+                const.DATE_POSTED: (
+                    date(2025, 1, 1) + timedelta(days=rnd.randint(0, 364))
+                ).strftime("%d-%m-%Y"),
+                const.DESCRIPTION: f"Linje {i}",
+                const.AMOUNT: random_amount(rnd),
+                const.TOTAL: random_amount(rnd),
+            }
+            for i in range(1000)
+        ] + [
+            {
+                const.DATE_POSTED: "02-01-2025",
+                const.DESCRIPTION: value,
+                const.AMOUNT: value,
+                const.TOTAL: value,
+            }
+            for value in EDGE_CASES
+        ]
+        expected = BankTransaction.from_bank_csv_rowwise(rows)
+        actual = BankTransaction.from_bank_csv(rows)
+        self.assertEqual(actual, expected)
+        self.assertEqual(
+            [(str(t.amount), str(t.total)) for t in actual],
+            [(str(t.amount), str(t.total)) for t in expected],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+"""Fakturaerne mod salgsposteringerne i et syntetisk firma.
+
+python -m unittest discover tests
+"""
+
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT_PATH, "src"))
+sys.path.insert(0, os.path.join(ROOT_PATH, "benchmarks"))
+
+import constants as const  # noqa: E402
+import synthetic  # noqa: E402
+from context import LedgerContext  # noqa: E402
+from invoice import Invoice, assign_numbers  # noqa: E402
+from transaction import Transaction  # noqa: E402
+
+
+class InvoiceTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.root = tempfile.TemporaryDirectory()
+        cls.periods, enddate = synthetic.generate_company(
+            cls.root.name, "firma", 1, 10, 5
+        )
+        cls.cwd = os.getcwd()
+        os.chdir(cls.root.name)
+        cls.ctx = LedgerContext(company_name="firma", enddate=enddate)
+        cls.rows = list(cls.ctx.get_salg_csv(cls.periods[0]))
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        cls.root.cleanup()
+
+    def test_total_equals_salg_posting(self):
+        invoices = Invoice.from_salg_csv(self.rows, self.ctx)
+        transactions = Transaction.from_salg_csv(self.rows, self.ctx)
+        self.assertEqual(len(invoices), len(transactions))
+        self.assertTrue(invoices)
+        for invoice, transaction in zip(invoices, transactions):
+            self.assertEqual(invoice.customer, transaction.account2.split(":")[-1])
+            self.assertEqual(invoice.total, transaction.amount)
+
+    def test_missing_prices_are_reported(self):
+        row = dict(self.rows[0], **{const.ACCOUNT_NAME: "UkendtKunde"})
+        errors = []
+        invoices = Invoice.from_salg_csv(self.rows + [row], self.ctx, errors)
+        self.assertEqual(len(invoices), len(self.rows))
+        self.assertEqual(
+            errors,
+            [
+                f"Ingen {price_type} for UkendtKunde pr. {row[const.YYMMDD]}"
+                for price_type in ("Timepris", "Support")
+            ],
+        )
+        with self.assertRaises(ValueError):
+            Invoice.from_salg_csv([row], self.ctx)
+
+    def test_numbers_follow_the_sale(self):
+        period = self.periods[0]
+        with tempfile.TemporaryDirectory() as bilag_path:
+            manifest = {}
+            invoices = Invoice.from_salg_csv(self.rows, self.ctx)
+            assign_numbers(invoices, period, manifest, bilag_path)
+            numbers = {invoice.key: invoice.number for invoice in invoices}
+            self.assertEqual(
+                [invoice.number for invoice in invoices],
+                [f"{period}-{i:03d}" for i in range(1, len(invoices) + 1)],
+            )
+
+            # salg.txt sorteret om og et salg fjernet
+            rows = list(reversed(self.rows[1:]))
+            invoices = Invoice.from_salg_csv(rows, self.ctx)
+            assign_numbers(invoices, period, manifest, bilag_path)
+            for invoice in invoices:
+                self.assertEqual(invoice.number, numbers[invoice.key])
+
+            # et nyt salg faar naeste nummer, ogsaa selvom et salg er fjernet
+            new_row = dict(self.rows[0], **{const.PERIOD_TXT: "Ekstra"})
+            invoices = Invoice.from_salg_csv(rows + [new_row], self.ctx)
+            assign_numbers(invoices, period, manifest, bilag_path)
+            self.assertEqual(invoices[-1].number, f"{period}-{len(self.rows) + 1:03d}")
+
+
+if __name__ == "__main__":
+    unittest.main()